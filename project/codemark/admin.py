@@ -3,11 +3,12 @@ from django.contrib import admin
 from django.contrib import admin
 
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
-from .models import User, Department, Course, Class, File, Fixture, Text, FileSchema, Step, RunStep, TestStep, Level, Assignment, Submission, StepOutput, RunStepOutput, TestStepOutput, LevelOutput, Result
+from .models import User, Department, Course, Class, Blob, File, Fixture, Text, FileSchema, Step, RunStep, TestStep, Level, Assignment, Submission, StepOutput, RunStepOutput, TestStepOutput, LevelOutput, Result, Rerun, Fingerprint, PlagiarismReport
 
 admin.site.register(Department)
 admin.site.register(Course)
 admin.site.register(Class)
+admin.site.register(Blob)
 admin.site.register(File)
 admin.site.register(Fixture)
 admin.site.register(Text)
@@ -23,6 +24,9 @@ admin.site.register(RunStepOutput)
 admin.site.register(TestStepOutput)
 admin.site.register(LevelOutput)
 admin.site.register(Result)
+admin.site.register(Rerun)
+admin.site.register(Fingerprint)
+admin.site.register(PlagiarismReport)
 
 
 class UserAdmin(DjangoUserAdmin):
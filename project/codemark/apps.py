@@ -7,3 +7,4 @@ class CodemarkConfig(AppConfig):
     def ready(self):
         import codemark.tasks
         import codemark.consumers
+        import codemark.signals
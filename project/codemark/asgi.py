@@ -4,7 +4,7 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from django.conf.urls import url
 
-from .consumers import SubmissionConsumer
+from .consumers import SubmissionConsumer, PlagiarismConsumer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
@@ -14,6 +14,8 @@ application = ProtocolTypeRouter({
         URLRouter([
             url(
                 r'^ws/submission/(?P<submission_pk>[^/]+)/$', SubmissionConsumer.as_asgi()),
+            url(
+                r'^ws/plagiarism/(?P<report_pk>[^/]+)/$', PlagiarismConsumer.as_asgi()),
         ])
     ),
 })
@@ -1,13 +1,14 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async, async_to_sync
-from .models import Submission, Result, User, Class
-from .serializers import ResultSerializer
-from json import dumps
+from .models import Submission, Result, User, PlagiarismReport
+from .serializers import serialize_result
+from . import membership
+from json import dumps, loads
 
 
 class SubmissionConsumer(AsyncWebsocketConsumer):
     async def omit_hidden(self, data):
-        if await sync_to_async(lambda user: user not in Class.objects.get(submission=self.submission_pk).instructors.all())(self.user):
+        if not self.is_instructor:
             for level in data['level_outputs']:
                 level['step_outputs'] = [step for step in level['step_outputs'] if not step['hidden']]
             data['level_outputs'] = [level for level in data['level_outputs'] if len(level['step_outputs']) > 0]
@@ -19,18 +20,24 @@ class SubmissionConsumer(AsyncWebsocketConsumer):
         self.submission_group_name = 'submission_%s' % self.submission_pk
 
         submission_object = await sync_to_async(Submission.objects.get)(pk=self.submission_pk)
-        if await sync_to_async(lambda user, submission: user == submission.submitter or user in submission.enrolled_class.instructors.all())(self.user, submission_object):
+        self.is_instructor = await sync_to_async(membership.is_instructor)(self.user, submission_object.enrolled_class_id)
+        if self.is_instructor or self.user.pk == submission_object.submitter_id:
             await self.channel_layer.group_add(
                 self.submission_group_name,
                 self.channel_name
             )
             await self.accept()
-            query = await sync_to_async(Result.objects.filter)(submission=submission_object)
-            result = None
-            if await sync_to_async(query.count)() > 0:
-                result = await sync_to_async(query.latest)()
-            data = await self.omit_hidden(await sync_to_async(lambda: ResultSerializer(result).data)())
-            await self.send(dumps(data))
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        query = await sync_to_async(Result.objects.filter)(submission=self.submission_pk)
+        result = None
+        if await sync_to_async(query.count)() > 0:
+            result = await sync_to_async(query.latest)()
+        data = None
+        if result:
+            data = await self.omit_hidden(await sync_to_async(lambda: serialize_result(result))())
+        await self.send(dumps({'type': 'snapshot', 'data': data}))
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -38,6 +45,50 @@ class SubmissionConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def update(self, event):
-        data = await self.omit_hidden(event['data'])
+    async def receive(self, text_data):
+        if loads(text_data).get('type') == 'snapshot':
+            await self.send_snapshot()
+
+    async def refresh(self, event):
+        await self.send_snapshot()
+
+    async def delta(self, event):
+        data = {'type': 'delta', 'result': event['result'], 'version': event['version']}
+        # Hidden steps still advance the version so students don't mistake them for a gap
+        if not event['step']['hidden'] or self.is_instructor:
+            data['level'] = event['level']
+            data['step'] = event['step']
         await self.send(dumps(data))
+
+    async def output(self, event):
+        if event['hidden'] and not self.is_instructor:
+            return
+        await self.send(dumps({
+            'type': 'output', 'step': event['step'], 'stream': event['stream'], 'data': event['data']
+        }))
+
+
+class PlagiarismConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.report_pk = self.scope['url_route']['kwargs']['report_pk']
+        self.report_group_name = 'plagiarism_%s' % self.report_pk
+
+        report = await sync_to_async(PlagiarismReport.objects.get)(pk=self.report_pk)
+        if await sync_to_async(membership.is_instructor)(self.user, report.enrolled_class_id):
+            await self.channel_layer.group_add(
+                self.report_group_name,
+                self.channel_name
+            )
+            await self.accept()
+            # The job may have moved on before the page connected
+            await self.status({'status': report.status, 'url': report.url})
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.report_group_name,
+            self.channel_name
+        )
+
+    async def status(self, event):
+        await self.send(dumps({'type': 'status', 'status': event['status'], 'url': event['url']}))
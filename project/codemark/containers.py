@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import docker
+from django.conf import settings
+
+
+# Toolchains like cargo, npm and pip write below HOME, so it gets its own scratch mount
+HOME = '/home/codemark'
+ENVIRONMENT = {
+    'HOME': HOME,
+    'CARGO_HOME': HOME + '/.cargo',
+}
+# The only writable places in a pooled container besides the workspace, emptied between runs
+SCRATCH = ('/run', HOME, '/dev/shm')
+RESET = 'kill -9 -1; rm -rf ' + ' '.join(
+    '{0}/* {0}/.[!.]* {0}/..?*'.format(path) for path in SCRATCH)
+
+
+class PooledContainer:
+    def __init__(self, image, container, workspace):
+        self.image = image
+        self.container = container
+        self.workspace = workspace
+        self.uses = 0
+        self.idle_since = time.monotonic()
+
+    def healthy(self):
+        try:
+            self.container.reload()
+        except docker.errors.APIError:
+            return False
+        return self.container.status == 'running'
+
+    def reset(self):
+        # Kill everything left behind by the previous run except the init process
+        if self.container.exec_run(['sh', '-c', RESET]).exit_code != 0:
+            raise docker.errors.APIError('Could not reset container')
+        for name in os.listdir(self.workspace):
+            path = os.path.join(self.workspace, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def discard(self):
+        try:
+            self.container.kill()
+        except docker.errors.APIError:
+            pass
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+
+class ContainerPool:
+    def __init__(self, size, max_uses, idle_timeout):
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.client = None
+
+    def start(self, image):
+        with self.lock:
+            if self.client is None:
+                self.client = docker.from_env()
+        workspace = tempfile.mkdtemp()
+        # The image stays read-only so nothing a submission writes outlives the reset before the next one
+        container = self.client.containers.run(image, detach=True, auto_remove=True, tty=True, stdout=True, stderr=True, read_only=True, environment=ENVIRONMENT, tmpfs={
+            '/run': 'rw,nosuid,nodev',
+            HOME: 'rw,nosuid,nodev',
+        }, volumes={
+            workspace: {
+                'bind': '/tmp',
+                'mode': 'rw',
+            }
+        })
+        return PooledContainer(image, container, workspace)
+
+    def acquire(self, image):
+        # There is no reaper thread, idle containers past idle_timeout are only stopped here
+        self.evict()
+        while True:
+            with self.lock:
+                idle = self.idle.get(image)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                pooled = self.start(image)
+                break
+            if pooled.healthy():
+                break
+            pooled.discard()
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled):
+        if pooled.uses >= self.max_uses or not pooled.healthy():
+            pooled.discard()
+            return
+        try:
+            pooled.reset()
+        except (docker.errors.APIError, OSError):
+            pooled.discard()
+            return
+        pooled.idle_since = time.monotonic()
+        with self.lock:
+            idle = self.idle.setdefault(pooled.image, [])
+            if len(idle) < self.size:
+                idle.append(pooled)
+                pooled = None
+        if pooled is not None:
+            pooled.discard()
+
+    def evict(self):
+        expired = []
+        now = time.monotonic()
+        with self.lock:
+            for image, idle in self.idle.items():
+                expired += [pooled for pooled in idle if now - pooled.idle_since > self.idle_timeout]
+                self.idle[image] = [pooled for pooled in idle if now - pooled.idle_since <= self.idle_timeout]
+        for pooled in expired:
+            pooled.discard()
+
+    def prewarm(self, image, count):
+        with self.lock:
+            missing = min(count, self.size) - len(self.idle.get(image, []))
+        for _ in range(missing):
+            pooled = self.start(image)
+            with self.lock:
+                self.idle.setdefault(image, []).append(pooled)
+
+    def drain(self):
+        with self.lock:
+            idle = [pooled for pooled_list in self.idle.values() for pooled in pooled_list]
+            self.idle = {}
+        for pooled in idle:
+            pooled.discard()
+
+
+container_pool = ContainerPool(
+    settings.CONTAINER_POOL_SIZE,
+    settings.CONTAINER_POOL_MAX_USES,
+    settings.CONTAINER_POOL_IDLE_TIMEOUT
+)
@@ -0,0 +1,123 @@
+import re
+
+REMOVED = -1
+EQUAL = 0
+ADDED = 1
+
+
+def tokens(text):
+    # Lines and the newlines between them, like diffLines with newlineIsToken
+    return [token for token in re.split(r'(\n)', text) if token]
+
+
+def bisect(a, b, max_cost=None):
+    """Myers' middle snake, searched from both ends so only two diagonal vectors are kept."""
+    len_a, len_b = len(a), len(b)
+    max_d = (len_a + len_b + 1) // 2
+    offset = max_d
+    length = 2 * max_d + 2
+    forward = [-1] * length
+    forward[offset + 1] = 0
+    backward = [-1] * length
+    backward[offset + 1] = 0
+    delta = len_a - len_b
+    front = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(min(max_d, max_cost or max_d)):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < len_a and y1 < len_b and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > len_a:
+                k1_end += 2
+            elif y1 > len_b:
+                k1_start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < length and backward[k2_offset] != -1 and x1 >= len_a - backward[k2_offset]:
+                    return x1, y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < len_a and y2 < len_b and a[-x2 - 1] == b[-y2 - 1]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > len_a:
+                k2_end += 2
+            elif y2 > len_b:
+                k2_start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < length and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    if x1 >= len_a - x2:
+                        return x1, offset + x1 - k1_offset
+    return None
+
+
+def edits(a, b, max_cost=None):
+    """Edit script turning a into b as (operation, count) pairs.
+
+    Ranges whose middle snake isn't found within max_cost edits are replaced whole.
+    """
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-suffix - 1] == b[-suffix - 1]:
+        suffix += 1
+    a, b = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    script = [(EQUAL, prefix)]
+    if not a or not b:
+        script += [(REMOVED, len(a)), (ADDED, len(b))]
+    else:
+        split = bisect(a, b, max_cost)
+        if split is None:
+            script += [(REMOVED, len(a)), (ADDED, len(b))]
+        else:
+            x, y = split
+            script += edits(a[:x], b[:y], max_cost) + \
+                edits(a[x:], b[y:], max_cost)
+    script.append((EQUAL, suffix))
+    return [(operation, count) for operation, count in script if count]
+
+
+def diff(expected, actual, case_insensitive=False, strip_whitespace=False, limit=None, max_cost=None):
+    """Line diff of two outputs as [operation, text] hunks, None when either has more than limit tokens."""
+    if strip_whitespace:
+        expected, actual = expected.strip(), actual.strip()
+    a, b = tokens(expected), tokens(actual)
+    if limit is not None and max(len(a), len(b)) > limit:
+        return None
+    if case_insensitive:
+        keys_a, keys_b = [token.lower() for token in a], [token.lower() for token in b]
+    else:
+        keys_a, keys_b = a, b
+    hunks = []
+    i = j = 0
+    for operation, count in edits(keys_a, keys_b, max_cost):
+        if operation == REMOVED:
+            text = ''.join(a[i:i + count])
+            i += count
+        else:
+            text = ''.join(b[j:j + count])
+            j += count
+            if operation == EQUAL:
+                i += count
+        if hunks and hunks[-1][0] == operation:
+            hunks[-1][1] += text
+        else:
+            hunks.append([operation, text])
+    return hunks
@@ -0,0 +1,108 @@
+import codecs
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import timedelta
+
+
+# Runs the step in its own session and records the leader so the whole tree can be killed
+WRAPPER = 'setsid bash -c "$0" & pid=$!; echo $pid > {pid_file}; wait $pid; status=$?; rm -f {pid_file}; exit $status'
+KILL = 'pid=$(cat {pid_file}) && kill -9 -$pid $pid; rm -f {pid_file}'
+
+Execution = namedtuple(
+    'Execution', ['output', 'exit_code', 'timed_out', 'runtime', 'truncated'])
+
+
+class OutputBuffer:
+    def __init__(self, send, size, interval):
+        self.send = send
+        self.size = size
+        self.interval = interval
+        self.pending = {}
+        self.pending_size = 0
+        self.skipped = {}
+        self.decoders = {}
+        self.lock = threading.Lock()
+
+    def write(self, stream, data):
+        # Anything past the per-interval budget is dropped from the live view only
+        with self.lock:
+            if self.pending_size >= self.size:
+                self.skipped[stream] = self.skipped.get(stream, 0) + len(data)
+                return
+            decoder = self.decoders.setdefault(
+                stream, codecs.getincrementaldecoder('utf-8')('ignore'))
+            self.pending.setdefault(stream, []).append(decoder.decode(data))
+            self.pending_size += len(data)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            skipped, self.skipped = self.skipped, {}
+            self.pending_size = 0
+        for stream in set(pending) | set(skipped):
+            text = ''.join(pending.get(stream, []))
+            if stream in skipped:
+                text += '\n[{0} bytes not shown]\n'.format(skipped[stream])
+            self.send(stream, text)
+
+
+def collect(frames, demux, output, limit):
+    # Stops reading once a stream passes limit bytes, the caller kills the process
+    streams = ('stdout', 'stderr') if demux else ('output',)
+    chunks = {stream: [] for stream in streams}
+    sizes = {stream: 0 for stream in streams}
+    truncated = False
+    for frame in frames:
+        for stream, data in zip(streams, frame if demux else (frame,)):
+            if data:
+                if output:
+                    output.write(stream, data)
+                room = limit - sizes[stream] if limit else len(data)
+                chunks[stream].append(data[:room])
+                sizes[stream] += len(data)
+                truncated = truncated or len(data) > room
+        if truncated:
+            frames.close()
+            break
+    joined = tuple(b''.join(chunks[stream]) or None for stream in streams)
+    return (joined if demux else joined[0]), truncated
+
+
+def exec_command(container, command, timeout, demux=False, output=None, limit=None):
+    api = container.client.api
+    pid_file = '/run/codemark-{0}.pid'.format(uuid.uuid4().hex)
+    start = time.monotonic()
+    exec_id = api.exec_create(
+        container.id, ['sh', '-c', WRAPPER.format(pid_file=pid_file), command], workdir='/tmp'
+    )['Id']
+    frames = api.exec_start(exec_id, stream=True, demux=demux)
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(collect, frames, demux, output, limit)
+    executor.shutdown(wait=False)
+    deadline = start + timeout.total_seconds() if timeout.total_seconds() else None
+    while True:
+        wait = output.interval if output else None
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+            wait = remaining if wait is None else min(wait, remaining)
+        try:
+            res, truncated = future.result(timeout=wait)
+            break
+        except TimeoutError:
+            if deadline is not None and time.monotonic() >= deadline:
+                runtime = timedelta(seconds=time.monotonic() - start)
+                container.exec_run(['sh', '-c', KILL.format(pid_file=pid_file)])
+                if output:
+                    output.flush()
+                return Execution(None, None, True, runtime, False)
+            if output:
+                output.flush()
+    runtime = timedelta(seconds=time.monotonic() - start)
+    if truncated:
+        container.exec_run(['sh', '-c', KILL.format(pid_file=pid_file)])
+    if output:
+        output.flush()
+    return Execution(res, api.exec_inspect(exec_id)['ExitCode'], False, runtime, truncated)
@@ -4,7 +4,7 @@ from django.forms import Form, ModelForm, ModelChoiceField, Select, SelectMultip
 from django.utils.translation import gettext_lazy as _
 from django_addanother.widgets import AddAnotherWidgetWrapper, AddAnotherEditSelectedWidgetWrapper
 from django.urls import reverse_lazy
-from .models import Class, File, Assignment, Fixture, FileSchema, Level, Step, File, Text, RunStep, TestStep
+from .models import Class, File, Assignment, Fixture, FileSchema, Level, Step, File, Text, RunStep, TestStep, PlagiarismReport
 
 
 class RegisterForm(UserCreationForm):
@@ -331,3 +331,4 @@ class PlagiarismForm(Form):
     )
 
     language_field = ChoiceField(choices=LANGUAGE_CHOICES, label='Language')
+    engine_field = ChoiceField(choices=PlagiarismReport.Engine.choices, label='Engine')
@@ -0,0 +1,157 @@
+import csv
+
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Subquery
+
+from .models import Submission, Result, Rerun
+
+
+STUDENT_COLUMNS = ('last_name', 'first_name', 'username', 'school_id')
+ASSIGNMENT_COLUMNS = {
+    'timestamp': 'timestamp',
+    'grade': 'score',
+}
+
+
+def latest_score(submission):
+    # Queued and running results have no score yet, so a rerun in flight keeps showing the last grade
+    return Subquery(Result.objects.filter(submission=submission).exclude(
+        score=None).order_by('-timestamp', '-pk').values('score')[:1])
+
+
+class Cell:
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.latest = submissions[0] if submissions else None
+
+    @property
+    def timestamp(self):
+        return self.latest.timestamp if self.latest else None
+
+    @property
+    def grade(self):
+        if self.latest is None:
+            return ''
+        if self.latest.score is None:
+            result = self.latest.current_result
+            if result and result.status in (Result.Status.QUEUED, Result.Status.RUNNING):
+                return 'Pending'
+            return ''
+        return self.latest.score
+
+
+class Gradebook:
+    """Latest submission and grade of every student for every assignment of a class."""
+
+    def __init__(self, enrolled_class, sort=None, page=1, per_page=50):
+        self.enrolled_class = enrolled_class
+        self.assignments = list(enrolled_class.assignments.all())
+        self.sort = sort if self.valid_sort(sort) else STUDENT_COLUMNS[0]
+        students = enrolled_class.students.order_by(
+            *self.student_ordering())
+        self.page = Paginator(students, per_page).get_page(page)
+        self.students = list(self.page)
+        self.cells = self.build_cells()
+        self.reruns = self.build_reruns()
+
+    def valid_sort(self, sort):
+        if not sort:
+            return False
+        column = sort.lstrip('-')
+        if column in STUDENT_COLUMNS:
+            return True
+        name, _, assignment_pk = column.partition('-')
+        return name in ASSIGNMENT_COLUMNS and assignment_pk in [str(assignment.pk) for assignment in self.assignments]
+
+    def student_ordering(self):
+        descending = self.sort.startswith('-')
+        column = self.sort.lstrip('-')
+        if column in STUDENT_COLUMNS:
+            ordering = '-' + column if descending else column
+        else:
+            name, _, assignment_pk = column.partition('-')
+            ordering = Subquery(
+                Submission.objects.filter(
+                    submitter=OuterRef('pk'),
+                    enrolled_class=self.enrolled_class,
+                    assignment=assignment_pk
+                ).annotate(score=latest_score(OuterRef('pk'))).order_by('-timestamp').values(ASSIGNMENT_COLUMNS[name])[:1]
+            )
+            ordering = ordering.desc(nulls_last=True) if descending else ordering.asc(nulls_last=True)
+        return [ordering, 'last_name', 'first_name', 'pk']
+
+    def build_cells(self):
+        submissions = {}
+        for submission in Submission.objects.filter(
+            enrolled_class=self.enrolled_class,
+            submitter__in=self.students
+        ).annotate(score=latest_score(OuterRef('pk'))).select_related('current_result').order_by('-timestamp', '-pk'):
+            submissions.setdefault(
+                (submission.submitter_id, submission.assignment_id), []).append(submission)
+        return {
+            key: Cell(submission_list) for key, submission_list in submissions.items()
+        }
+
+    def build_reruns(self):
+        reruns = Rerun.objects.filter(enrolled_class=self.enrolled_class).order_by(
+            'assignment', '-timestamp').distinct('assignment')
+        return {rerun.assignment_id: rerun for rerun in reruns}
+
+    def cell(self, student, assignment):
+        return self.cells.get((student.pk, assignment.pk)) or Cell([])
+
+    @property
+    def tables(self):
+        return [
+            (assignment, self.reruns.get(assignment.pk), self.sort_links(
+                [name + '-' + str(assignment.pk) for name in ASSIGNMENT_COLUMNS]
+            ), [
+                (student, self.cell(student, assignment)) for student in self.students
+            ]) for assignment in self.assignments
+        ]
+
+    def sort_links(self, columns=STUDENT_COLUMNS):
+        # Keyed by column name without the assignment, clicking the sorted column reverses it
+        return {
+            column.partition('-')[0]: '-' + column if self.sort == column else column for column in columns
+        }
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_rows(enrolled_class, assignments, chunk_size=500):
+    """CSV rows of every student's latest timestamp and grade, read from one server-side cursor."""
+    annotations = {}
+    for assignment in assignments:
+        latest = Submission.objects.filter(
+            submitter=OuterRef('pk'),
+            enrolled_class=enrolled_class,
+            assignment=assignment
+        ).order_by('-timestamp')
+        annotations['timestamp_{0}'.format(assignment.pk)] = Subquery(
+            latest.values('timestamp')[:1])
+        annotations['grade_{0}'.format(assignment.pk)] = Subquery(
+            latest.annotate(grade=latest_score(OuterRef('pk'))).values('grade')[:1])
+    writer = csv.writer(Echo())
+    header = ['Last Name', 'First Name', 'Username', 'Student ID']
+    for assignment in assignments:
+        prefix = str(assignment) + ' ' if len(assignments) > 1 else ''
+        header += [
+            prefix + 'Last Access',
+            prefix + 'Grade [Total Pts: {0}]'.format(assignment.total_points)
+        ]
+    yield writer.writerow(header)
+    students = enrolled_class.students.annotate(**annotations).order_by(
+        'last_name', 'first_name', 'pk').values_list(
+        'last_name', 'first_name', 'username', 'school_id', *annotations)
+    for student in students.iterator(chunk_size=chunk_size):
+        row = list(student[:4])
+        for timestamp, grade in zip(student[4::2], student[5::2]):
+            row += [
+                timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
+                grade if grade is not None else ''
+            ]
+        yield writer.writerow(row)
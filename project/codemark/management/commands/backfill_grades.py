@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from codemark.models import Submission, Result
+
+
+class Command(BaseCommand):
+    help = 'Store the grades of results and the current result of submissions created before either was stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        results = Result.objects.filter(score=None, status__in=[
+            Result.Status.FINISHED, Result.Status.FAILED
+        ]).order_by('pk')
+        graded = 0
+        for result in results.iterator(chunk_size=options['chunk_size']):
+            result.update_grade()
+            graded += 1
+        linked = Submission.objects.filter(current_result=None).update(
+            current_result=Subquery(Result.objects.filter(
+                submission=OuterRef('pk')).order_by('-timestamp', '-pk').values('pk')[:1])
+        )
+        self.stdout.write('Graded {0} results, linked {1} submissions'.format(graded, linked))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from codemark.models import Result
+from codemark.serializers import ResultSerializer, serialize_result
+
+
+class Command(BaseCommand):
+    help = 'Compare ResultSerializer with serialize_result on an existing result'
+
+    def add_arguments(self, parser):
+        parser.add_argument('result_pk', type=int)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        result = Result.objects.get(pk=options['result_pk'])
+        paths = {
+            'ResultSerializer': lambda: ResultSerializer(Result.objects.get(pk=result.pk)).data,
+            'serialize_result': lambda: serialize_result(result),
+        }
+        outputs = {}
+        for name, serialize in paths.items():
+            with CaptureQueriesContext(connection) as queries:
+                outputs[name] = serialize()
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                serialize()
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write('{0}: {1:.2f} ms, {2} queries'.format(
+                name, elapsed * 1000, len(queries.captured_queries)))
+        steps = sum(len(level['step_outputs'])
+                    for level in outputs['serialize_result']['level_outputs'])
+        self.stdout.write('{0} steps, identical output: {1}'.format(
+            steps, outputs['ResultSerializer'] == outputs['serialize_result']))
@@ -0,0 +1,58 @@
+import socketserver
+
+from django.core.management.base import BaseCommand
+
+
+class MossHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        files = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            words = line.decode().split()
+            if not words:
+                continue
+            if words[0] == 'language':
+                self.wfile.write(b'yes\n')
+            elif words[0] == 'file':
+                # file <id> <language> <size> <name>, followed by the contents
+                self.rfile.read(int(words[3]))
+                files += 1
+            elif words[0] == 'query':
+                number = self.server.record(files)
+                self.wfile.write('{0}/results/{1}\n'.format(self.server.url, number).encode())
+            elif words[0] == 'end':
+                return
+
+
+class MossStandIn(socketserver.ThreadingTCPServer):
+    """Speaks enough of the MOSS protocol for mosspy, answering every query with a made up report URL."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, url):
+        super(MossStandIn, self).__init__(address, MossHandler)
+        self.url = url
+        self.queries = []
+
+    def record(self, files):
+        self.queries.append(files)
+        return len(self.queries)
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the MOSS server, point MOSS_SERVER and MOSS_PORT at it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--port', type=int, default=7690)
+        parser.add_argument('--url', default='http://localhost/moss')
+
+    def handle(self, *args, **options):
+        server = MossStandIn((options['host'], options['port']), options['url'])
+        self.stdout.write('Listening on {0}:{1}'.format(*server.server_address))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
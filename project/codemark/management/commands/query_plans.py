@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from codemark.models import Class, Assignment, Submission, Result
+
+
+class Command(BaseCommand):
+    help = 'Print the query plans of the submission and result lookups on the hot paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('class_pk', type=int)
+        parser.add_argument('assignment_pk', type=int)
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run the queries and report actual timings')
+
+    def handle(self, *args, **options):
+        enrolled_class = Class.objects.get(pk=options['class_pk'])
+        assignment = Assignment.objects.get(pk=options['assignment_pk'])
+        submission = Submission.objects.filter(
+            enrolled_class=enrolled_class, assignment=assignment).latest()
+        queries = {
+            'latest submission of a student': Submission.objects.filter(
+                submitter=submission.submitter, assignment=assignment, enrolled_class=enrolled_class
+            ).order_by('-timestamp')[:1],
+            'latest result of a submission': Result.objects.filter(
+                submission=submission
+            ).order_by('-timestamp')[:1],
+            'latest submission of every student': Submission.objects.filter(
+                assignment=assignment, enrolled_class=enrolled_class
+            ).order_by('submitter', '-timestamp').distinct('submitter'),
+        }
+        for name, query in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(query.explain(analyze=options['analyze']))
@@ -0,0 +1,68 @@
+import re
+
+EXACT = 'exact'
+TOKENS = 'tokens'
+REGEX = 'regex'
+NUMERIC = 'numeric'
+LINES = 'lines'
+MATCHER_CHOICES = [
+    (EXACT, 'Exact'),
+    (TOKENS, 'Whitespace separated tokens'),
+    (REGEX, 'Regular expression'),
+    (NUMERIC, 'Numbers within tolerance'),
+    (LINES, 'Same lines in any order'),
+]
+
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+def exact(expected, actual, tolerance):
+    return 1.0 if expected == actual else 0.0
+
+
+def tokens(expected, actual, tolerance):
+    return 1.0 if expected.split() == actual.split() else 0.0
+
+
+def numeric(expected, actual, tolerance):
+    # Share of numbers within tolerance, a missing or extra number counts as wrong
+    expected = [float(number) for number in NUMBER.findall(expected)]
+    actual = [float(number) for number in NUMBER.findall(actual)]
+    if not expected and not actual:
+        return 1.0
+    close = sum(abs(a - b) <= tolerance for a, b in zip(expected, actual))
+    return close / max(len(expected), len(actual))
+
+
+def lines(expected, actual, tolerance):
+    # Jaccard similarity of the two sets of lines
+    expected = set(line.rstrip() for line in expected.splitlines())
+    actual = set(line.rstrip() for line in actual.splitlines())
+    if not expected and not actual:
+        return 1.0
+    return len(expected & actual) / len(expected | actual)
+
+
+MATCHERS = {
+    EXACT: exact,
+    TOKENS: tokens,
+    NUMERIC: numeric,
+    LINES: lines,
+}
+
+
+def match(matcher, expected, actual, case_insensitive=False, strip_whitespace=False, tolerance=0):
+    """Score between 0 and 1 of actual output against the expected output or pattern."""
+    if strip_whitespace:
+        expected, actual = expected.strip(), actual.strip()
+    if matcher == REGEX:
+        # Lowercasing a pattern would change escapes like \D, so the flag is used instead
+        try:
+            matched = re.fullmatch(expected, actual, re.MULTILINE | (
+                re.IGNORECASE if case_insensitive else 0))
+        except re.error:
+            return 0.0
+        return 1.0 if matched else 0.0
+    if case_insensitive:
+        expected, actual = expected.lower(), actual.lower()
+    return MATCHERS[matcher](expected, actual, tolerance)
@@ -0,0 +1,91 @@
+import redis
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .models import Class
+
+
+STUDENT = 's'
+INSTRUCTOR = 'i'
+
+client = redis.Redis.from_url(
+    settings.MEMBERSHIP_CACHE_URL,
+    socket_connect_timeout=settings.MEMBERSHIP_CACHE_SOCKET_TIMEOUT,
+    socket_timeout=settings.MEMBERSHIP_CACHE_SOCKET_TIMEOUT
+)
+
+
+def class_key(user_pk, class_pk):
+    return 'membership:{0}:{1}'.format(class_pk, user_pk)
+
+
+def instructor_key(user_pk):
+    return 'membership:instructor:{0}'.format(user_pk)
+
+
+def cached(user, key, load):
+    # Answers live on the user object for the rest of the request and in Redis across requests
+    local = user.__dict__.setdefault('_membership', {})
+    if key in local:
+        return local[key]
+    try:
+        value = client.get(key)
+    except redis.RedisError:
+        value = None
+    if value is None:
+        value = load()
+        try:
+            client.set(key, value, ex=settings.MEMBERSHIP_CACHE_TIMEOUT)
+        except redis.RedisError:
+            pass
+    else:
+        value = value.decode()
+    local[key] = value
+    return value
+
+
+def roles(user, enrolled_class):
+    if not user.is_authenticated:
+        return ''
+    class_pk = getattr(enrolled_class, 'pk', enrolled_class)
+
+    def load():
+        memberships = Class.objects.filter(pk=class_pk).annotate(
+            student=Exists(Class.students.through.objects.filter(
+                class_id=OuterRef('pk'), user_id=user.pk)),
+            instructor=Exists(Class.instructors.through.objects.filter(
+                class_id=OuterRef('pk'), user_id=user.pk))
+        ).values_list('student', 'instructor').first()
+        student, instructor = memberships or (False, False)
+        return (STUDENT if student else '') + (INSTRUCTOR if instructor else '')
+    return cached(user, class_key(user.pk, class_pk), load)
+
+
+def is_student(user, enrolled_class):
+    return STUDENT in roles(user, enrolled_class)
+
+
+def is_instructor(user, enrolled_class):
+    return INSTRUCTOR in roles(user, enrolled_class)
+
+
+def is_member(user, enrolled_class):
+    return roles(user, enrolled_class) != ''
+
+
+def instructs_any(user):
+    if not user.is_authenticated:
+        return False
+    return cached(user, instructor_key(user.pk), lambda: INSTRUCTOR if Class.objects.filter(
+        instructors=user).exists() else '') == INSTRUCTOR
+
+
+def invalidate(user_pks, class_pks):
+    keys = [class_key(user_pk, class_pk)
+            for user_pk in user_pks for class_pk in class_pks]
+    keys += [instructor_key(user_pk) for user_pk in user_pks]
+    if keys:
+        try:
+            client.delete(*keys)
+        except redis.RedisError:
+            pass
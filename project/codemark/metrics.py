@@ -0,0 +1,96 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+
+LABELS = ('assignment', 'level', 'image', 'step_type')
+KEY = 'metrics:phase_seconds'
+
+client = redis.Redis.from_url(
+    settings.METRICS_URL,
+    socket_connect_timeout=settings.METRICS_SOCKET_TIMEOUT,
+    socket_timeout=settings.METRICS_SOCKET_TIMEOUT
+)
+logger = logging.getLogger(__name__)
+# Observations wait here until flush() so timed sections never talk to Redis
+pending = Counter()
+pending_lock = threading.Lock()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def series(phase, labels):
+    return ','.join('{0}="{1}"'.format(name, escape(value)) for name, value in [('phase', phase)] + [
+        (name, labels.get(name, '')) for name in LABELS
+    ])
+
+
+def observe(phase, seconds, **labels):
+    logger.info(json.dumps(dict(event='phase', phase=phase, seconds=round(seconds, 6), **labels)))
+    # Buckets live in one Redis hash so every worker process adds to the same histogram
+    bucket = next((str(bound) for bound in settings.METRICS_BUCKETS if seconds <= bound), '+Inf')
+    name = series(phase, labels)
+    with pending_lock:
+        pending[name + '\t' + bucket] += 1
+        pending[name + '\tsum'] += seconds
+
+
+def flush():
+    with pending_lock:
+        fields = dict(pending)
+        pending.clear()
+    if not fields:
+        return
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for field, value in fields.items():
+            if field.endswith('\tsum'):
+                pipeline.hincrbyfloat(KEY, field, value)
+            else:
+                pipeline.hincrby(KEY, field, value)
+        pipeline.execute()
+    except redis.RedisError:
+        # Kept for the next flush, the buffer only grows by one field per series
+        with pending_lock:
+            pending.update(fields)
+
+
+@contextmanager
+def timed(phase, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - start, **labels)
+
+
+def render():
+    """Phase histograms in the Prometheus text exposition format."""
+    try:
+        fields = client.hgetall(KEY)
+    except redis.RedisError:
+        fields = {}
+    histograms = defaultdict(dict)
+    for field, value in fields.items():
+        name, _, bucket = field.decode().rpartition('\t')
+        histograms[name][bucket] = float(value)
+    lines = [
+        '# HELP codemark_phase_seconds Time spent in each phase of grading a submission',
+        '# TYPE codemark_phase_seconds histogram',
+    ]
+    for name, values in sorted(histograms.items()):
+        count = 0
+        for bucket in [str(bound) for bound in settings.METRICS_BUCKETS] + ['+Inf']:
+            count += values.get(bucket, 0)
+            lines.append('codemark_phase_seconds_bucket{{{0},le="{1}"}} {2}'.format(name, bucket, int(count)))
+        lines.append('codemark_phase_seconds_sum{{{0}}} {1}'.format(name, values.get('sum', 0)))
+        lines.append('codemark_phase_seconds_count{{{0}}} {1}'.format(name, int(count)))
+    return '\n'.join(lines) + '\n'
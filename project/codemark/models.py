@@ -1,11 +1,17 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Max, Sum
 from phonenumber_field.modelfields import PhoneNumberField
 from django.contrib.auth.models import AbstractUser, PermissionsMixin, Group
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from polymorphic.models import PolymorphicModel
+from .cache import file_hash
+from .matchers import MATCHER_CHOICES, EXACT, match
 from datetime import timedelta, datetime
+from collections import namedtuple
+import gzip
 import os
 import shutil
 
@@ -40,7 +46,8 @@ class User(AbstractUser):
 
     @property
     def is_instructor(self):
-        return Class.objects.filter(instructors=self).count() > 0
+        from .membership import instructs_any
+        return instructs_any(self)
 
 
 class Department(models.Model):
@@ -55,18 +62,79 @@ def user_directory_path(instance, filename):
     return 'user/{0}/{1}/{2}'.format(instance.creator.id, datetime.now().strftime('%Y-%m-%d--%H-%M-%S'), filename)
 
 
+def blob_path(instance, filename):
+    # The pk keeps a blob recreated after its last release from sharing a name with the deleted one
+    return 'blob/{0}/{1}'.format(instance.sha256, instance.pk)
+
+
+class Blob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_path)
+    references = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def acquire(cls, content):
+        sha256 = file_hash(content)
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(sha256=sha256)
+            if created:
+                blob.file.save(os.path.basename(content.name), content, save=False)
+            blob.references += 1
+            blob.save()
+        return blob
+
+    def release(self):
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().get(pk=self.pk)
+            blob.references -= 1
+            if blob.references > 0:
+                blob.save(update_fields=['references'])
+                return
+            name = blob.file.name
+            blob.delete()
+            transaction.on_commit(lambda: blob.file.storage.delete(name))
+
+    def __str__(self):
+        return self.sha256
+
+
 class File(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, blank=True, editable=False)
     file = models.FileField(upload_to=user_directory_path)
+    sha256 = models.CharField(
+        max_length=64, blank=True, null=True, editable=False
+    )
+    # Shared with every other file of the same content, files uploaded before blobs have none
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, blank=True, null=True, editable=False, related_name='files'
+    )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            released = None
+            if self.file and not self.file._committed:
+                released = self.blob
+                self.name = os.path.basename(self.file.name)
+                self.blob = Blob.acquire(self.file.file)
+                self.sha256 = self.blob.sha256
+                self.file = self.blob.file.name
+            super(File, self).save(*args, **kwargs)
+            if released:
+                released.release()
+
+    @property
+    def filename(self):
+        return self.name or os.path.basename(self.file.name)
 
     def copy(self, dest, name=None):
         if not name:
-          name = self.file.name
+          name = self.filename
         dst = open(os.path.join(dest, os.path.basename(name)), "wb")
         shutil.copyfileobj(self.file, dst)
 
     def __str__(self):
-        return os.path.basename(self.file.name)
+        return self.filename
 
 
 class Fixture(models.Model):
@@ -131,6 +199,15 @@ class TestStep(Step):
     expected_output = models.TextField()
     case_insensitive = models.BooleanField()
     strip_whitespace = models.BooleanField()
+    matcher = models.CharField(
+        max_length=10,
+        choices=MATCHER_CHOICES,
+        default=EXACT,
+    )
+    tolerance = models.FloatField(
+        default=0, validators=[MinValueValidator(0)],
+        help_text='Largest difference allowed between numbers'
+    )
 
     def __str__(self):
         return self.command + ' - ' + str(self.number)
@@ -151,6 +228,10 @@ class Level(models.Model):
         return self.name
 
 
+SubmissionStatus = namedtuple(
+    'SubmissionStatus', ['count', 'latest', 'remaining', 'cool_off_end', 'submittable'])
+
+
 class Assignment(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=30)
@@ -167,31 +248,60 @@ class Assignment(models.Model):
     submission_files = models.ForeignKey(
         FileSchema, on_delete=models.PROTECT, blank=True, null=True
     )
+    parallel_levels = models.BooleanField(
+        default=False, verbose_name='Run levels in parallel'
+    )
+    carry_workspace = models.BooleanField(
+        default=False, verbose_name='Keep workspace between levels with the same container'
+    )
+    nondeterministic = models.BooleanField(
+        default=False, verbose_name='Always rerun (nondeterministic tests)'
+    )
+    # Sum of step weights, cleared whenever a level or step of the assignment changes
+    points = models.IntegerField(blank=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
 
     def submittable(self, user):
-        query = Submission.objects.filter(
-            submitter=user).filter(assignment=self)
-        if self.submission_limit and query.count() > self.submission_limit:
-            return False
-        elif query.count() > 0 and timezone.now() - query.latest().timestamp < self.cool_off:
-            return False
-        elif self.late_deadline:
-            return timezone.now() < self.late_deadline
-        elif self.deadline:
-            return timezone.now() < self.deadline
-        else:
-            return True
+        return Assignment.submission_statuses([self], user)[self.pk].submittable
+
+    @staticmethod
+    def submission_statuses(assignments, user):
+        """Submission count, attempts left and cool-off end of each assignment for a user, from one query."""
+        now = timezone.now()
+        submissions = {
+            row['assignment']: row for row in Submission.objects.filter(
+                submitter=user, assignment__in=assignments
+            ).order_by().values('assignment').annotate(count=Count('pk'), latest=Max('timestamp'))
+        }
+        statuses = {}
+        for assignment in assignments:
+            row = submissions.get(assignment.pk, {'count': 0, 'latest': None})
+            remaining = None
+            if assignment.submission_limit:
+                remaining = max(assignment.submission_limit + 1 - row['count'], 0)
+            cool_off_end = None
+            if row['latest'] and now - row['latest'] < assignment.cool_off:
+                cool_off_end = row['latest'] + assignment.cool_off
+            deadline = assignment.late_deadline or assignment.deadline
+            statuses[assignment.pk] = SubmissionStatus(
+                row['count'],
+                row['latest'],
+                remaining,
+                cool_off_end,
+                remaining != 0 and cool_off_end is None and (
+                    deadline is None or now < deadline)
+            )
+        return statuses
 
     @property
     def total_points(self):
-        points = 0
-        for level in self.levels.all():
-            for step in level.steps.all():
-                points += step.weight
-        return points
+        if self.points is None:
+            self.points = Step.objects.filter(level__assignment=self).aggregate(
+                points=Sum('weight'))['points'] or 0
+            Assignment.objects.filter(pk=self.pk).update(points=self.points)
+        return self.points
 
     @property
     def past_due(self):
@@ -263,20 +373,57 @@ class Submission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     enrolled_class = models.ForeignKey(Class, on_delete=models.CASCADE)
     files = models.ManyToManyField(File)
+    current_result = models.ForeignKey(
+        'Result', on_delete=models.SET_NULL, blank=True, null=True, related_name='+'
+    )
 
     def __str__(self):
         return self.assignment.name + ' ' + self.submitter.get_full_name() + ' - ' + str(self.timestamp)
 
+    class Meta:
+        ordering = ['-timestamp']
+        get_latest_by = ['timestamp']
+        indexes = [
+            # A student's submissions to an assignment in any class, newest first
+            models.Index(
+                fields=['submitter', 'assignment', '-timestamp'],
+                name='submission_latest_idx'
+            ),
+            # Latest submission of one or every student of a class, DISTINCT ON submitter
+            models.Index(
+                fields=['assignment', 'enrolled_class', 'submitter', '-timestamp'],
+                name='submission_distinct_idx'
+            ),
+        ]
+
+
+class Rerun(models.Model):
+    creator = models.ForeignKey(User, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
+    enrolled_class = models.ForeignKey(Class, on_delete=models.CASCADE)
+    total = models.IntegerField(null=True)
+
+    def __str__(self):
+        return self.assignment.name + ' ' + str(self.enrolled_class) + ' - ' + str(self.timestamp)
+
     @property
-    def latest_result(self):
-        query = Result.objects.filter(submission=self)
-        result = None
-        if query.count() > 0:
-            result = query.latest()
-        return result
+    def progress(self):
+        counts = dict(self.result_set.order_by().values_list(
+            'status').annotate(count=Count('pk')))
+        done = counts.get(Result.Status.FINISHED, 0)
+        failed = counts.get(Result.Status.FAILED, 0)
+        remaining = self.total - done - failed if self.total is not None else None
+        # A dead worker leaves results running and a failed rerun_assignment never sets total
+        stalled = remaining != 0 and timezone.now() - self.timestamp > timedelta(seconds=settings.RERUN_TIMEOUT)
+        return {
+            'done': done,
+            'failed': failed,
+            'remaining': remaining,
+            'stalled': stalled,
+        }
 
     class Meta:
-        ordering = ['-timestamp']
         get_latest_by = ['timestamp']
 
 
@@ -289,6 +436,15 @@ class StepOutput(PolymorphicModel):
         default=0, validators=[MinValueValidator(0)]
     )
     hidden = models.BooleanField()
+    # The step this was copied from, so weight changes can reach existing results
+    step = models.ForeignKey(
+        Step, on_delete=models.SET_NULL, blank=True, null=True, related_name='+'
+    )
+
+    # Fields filled in by running the step, copied when a result is reused
+    output_fields = ()
+    # Stream name to the file field holding its full compressed output
+    stream_fields = {}
 
     def __str__(self):
         return self.name + ' - ' + str(self.number)
@@ -307,6 +463,16 @@ class RunStepOutput(StepOutput):
     stdout = models.TextField(null=True)
     stderr = models.TextField(null=True)
     timed_out = models.BooleanField(null=True)
+    runtime = models.DurationField(null=True)
+    truncated = models.BooleanField(null=True)
+    # Set when stdout or stderr above is only a preview of the compressed copy in storage
+    offloaded = models.BooleanField(null=True)
+    stdout_file = models.FileField(blank=True, null=True)
+    stderr_file = models.FileField(blank=True, null=True)
+
+    output_fields = ('stdout', 'stderr', 'timed_out', 'runtime',
+                     'truncated', 'offloaded', 'stdout_file', 'stderr_file')
+    stream_fields = {'stdout': 'stdout_file', 'stderr': 'stderr_file'}
 
     def __str__(self):
         return self.command + ' - ' + str(self.number)
@@ -322,23 +488,51 @@ class TestStepOutput(StepOutput):
     expected_output = models.TextField()
     case_insensitive = models.BooleanField()
     strip_whitespace = models.BooleanField()
+    matcher = models.CharField(
+        max_length=10,
+        choices=MATCHER_CHOICES,
+        default=EXACT,
+    )
+    tolerance = models.FloatField(default=0)
     actual_output = models.TextField(null=True)
     timed_out = models.BooleanField(null=True)
+    runtime = models.DurationField(null=True)
+    truncated = models.BooleanField(null=True)
+    # Set when actual_output above is only a preview of the compressed copy in storage
+    offloaded = models.BooleanField(null=True)
+    actual_output_file = models.FileField(blank=True, null=True)
+    # Matcher outcome against the full output, stored so grading reads no text
+    passed = models.BooleanField(null=True)
+    score = models.FloatField(null=True)
+    # Line diff of expected and actual output as [operation, text] hunks, see codemark.diff
+    diff = models.JSONField(null=True)
+
+    output_fields = ('actual_output', 'timed_out', 'runtime',
+                     'truncated', 'offloaded', 'actual_output_file', 'passed', 'score', 'diff')
+    stream_fields = {'output': 'actual_output_file'}
 
     def __str__(self):
         return self.command + ' - ' + str(self.number)
 
+    def full_output(self):
+        if not self.actual_output_file:
+            return self.actual_output or ''
+        with gzip.open(self.actual_output_file.open('rb')) as output:
+            return output.read().decode('utf-8', 'ignore')
+
+    def evaluate(self, actual):
+        self.score = match(self.matcher, str(self.expected_output), actual,
+                           self.case_insensitive, self.strip_whitespace, self.tolerance)
+        self.passed = self.score == 1
+
     @property
     def grade(self):
-        expected = str(self.expected_output)
-        actual = str(self.actual_output)
-        if self.case_insensitive:
-            expected = expected.lower()
-            actual = actual.lower()
-        if self.strip_whitespace:
-            expected = expected.strip()
-            actual = actual.strip()
-        return self.weight if expected == actual else 0
+        score = self.score
+        if score is None:
+            # Outputs stored before scores were, graded from the text in the row
+            score = match(self.matcher, str(self.expected_output), str(self.actual_output),
+                          self.case_insensitive, self.strip_whitespace, self.tolerance)
+        return round(self.weight * score)
 
 
 class LevelOutput(models.Model):
@@ -356,20 +550,115 @@ class LevelOutput(models.Model):
 
 
 class Result(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'QU', _('Queued')
+        RUNNING = 'RU', _('Running')
+        FINISHED = 'FI', _('Finished')
+        FAILED = 'FA', _('Failed')
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
     level_outputs = models.ManyToManyField(LevelOutput)
+    status = models.CharField(
+        max_length=2,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    rerun = models.ForeignKey(
+        Rerun, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    version = models.IntegerField(default=0)
+    fingerprint = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True
+    )
+    score = models.IntegerField(blank=True, null=True)
+    max_score = models.IntegerField(blank=True, null=True)
+    level_scores = models.JSONField(blank=True, null=True)
 
     def __str__(self):
         return str(self.submission)
 
+    def grade_breakdown(self):
+        levels = []
+        for level in self.level_outputs.order_by('pk').prefetch_related('step_outputs'):
+            steps = level.step_outputs.all()
+            levels.append({
+                'name': level.name,
+                'score': sum(step.grade for step in steps),
+                'max_score': sum(step.weight for step in steps),
+            })
+        return levels
+
+    def update_grade(self):
+        self.level_scores = self.grade_breakdown()
+        self.score = sum(level['score'] for level in self.level_scores)
+        self.max_score = sum(level['max_score']
+                             for level in self.level_scores)
+        self.save(update_fields=['score', 'max_score', 'level_scores'])
+
     @property
     def grade(self):
-        points = 0
-        for level in self.level_outputs.all():
-            for step in level.step_outputs.all():
-                points += step.grade
-        return points
+        if self.score is None:
+            return sum(level['score'] for level in self.grade_breakdown())
+        return self.score
 
     class Meta:
         get_latest_by = ['timestamp']
+        indexes = [
+            models.Index(
+                fields=['submission', '-timestamp'], name='result_latest_idx'
+            ),
+        ]
+
+
+class Fingerprint(models.Model):
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    language = models.CharField(max_length=10)
+    # Winnowed k-gram hashes as [hash, file pk, first line, last line], see codemark.plagiarism
+    fingerprints = models.JSONField(default=list)
+
+    def __str__(self):
+        return str(self.submission) + ' - ' + self.language
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['submission', 'language'], name='fingerprint_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['assignment', 'language'], name='fingerprint_assignment_idx'
+            ),
+        ]
+
+
+class PlagiarismReport(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'QU', _('Queued')
+        RUNNING = 'RU', _('Running')
+        FINISHED = 'FI', _('Finished')
+        FAILED = 'FA', _('Failed')
+
+    class Engine(models.TextChoices):
+        LOCAL = 'local', _('Built-in')
+        MOSS = 'moss', _('Stanford MOSS')
+    creator = models.ForeignKey(User, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
+    enrolled_class = models.ForeignKey(Class, on_delete=models.CASCADE)
+    language = models.CharField(max_length=10)
+    engine = models.CharField(
+        max_length=10, choices=Engine.choices, default=Engine.LOCAL
+    )
+    status = models.CharField(
+        max_length=2, choices=Status.choices, default=Status.QUEUED
+    )
+    # Where MOSS put its report, local reports are rendered from pairs
+    url = models.URLField(blank=True)
+    submissions = models.IntegerField(null=True)
+    # Most similar pairs first, see codemark.plagiarism.compare
+    pairs = models.JSONField(default=list)
+
+    def __str__(self):
+        return self.assignment.name + ' ' + self.language + ' - ' + str(self.timestamp)
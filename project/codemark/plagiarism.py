@@ -0,0 +1,298 @@
+import hashlib
+import keyword
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import mosspy
+from django.conf import settings
+from django.db import connection
+
+from .cache import file_cache
+from .models import Fingerprint, PlagiarismReport, Submission
+
+
+C_COMMENTS = r'//[^\n]*|/\*.*?\*/'
+COMMENTS = {
+    'c': C_COMMENTS,
+    'cc': C_COMMENTS,
+    'java': C_COMMENTS,
+    'javascript': C_COMMENTS,
+    'pascal': r'//[^\n]*|\{.*?\}|\(\*.*?\*\)',
+    'haskell': r'--[^\n]*|\{-.*?-\}',
+    'fortran': r'![^\n]*',
+    'perl': r'#[^\n]*',
+    'python': r'#[^\n]*',
+    'matlab': r'%[^\n]*',
+}
+
+C_KEYWORDS = set('''
+    auto break case char const continue default do double else enum extern float for goto if int long register
+    return short signed sizeof static struct switch typedef union unsigned void volatile while
+'''.split())
+KEYWORDS = {
+    'c': C_KEYWORDS,
+    'cc': C_KEYWORDS | set('''
+        bool catch class delete false friend inline namespace new nullptr operator private protected public
+        std template this throw true try typename using virtual
+    '''.split()),
+    'java': set('''
+        abstract boolean break byte case catch char class continue default do double else extends false final
+        finally float for if implements import instanceof int interface long new null package private
+        protected public return short static super switch this throw throws true try void while
+    '''.split()),
+    'javascript': set('''
+        async await break case catch class const continue default delete do else export extends false finally
+        for function if import in instanceof let new null of return super switch this throw true try typeof
+        var void while yield
+    '''.split()),
+    'python': set(keyword.kwlist),
+    'pascal': set('''
+        and array begin case const div do downto else end for function if mod not of or procedure program
+        record repeat then to type until var while with
+    '''.split()),
+    'haskell': set('''
+        case class data deriving do else if import in infix instance let module newtype of then type where
+    '''.split()),
+    'fortran': set('''
+        allocate call character dimension do else end function if implicit integer logical none print program
+        read real return subroutine then write
+    '''.split()),
+    'perl': set('''
+        else elsif for foreach if last my next our print return sub unless until use while
+    '''.split()),
+    'matlab': set('''
+        break case continue else elseif end for function if otherwise return switch while
+    '''.split()),
+}
+CASE_INSENSITIVE = {'pascal', 'fortran'}
+
+STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+NUMBER = r'\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'
+IDENTIFIER = r'[A-Za-z_]\w*'
+TOKEN = {
+    language: re.compile('(?P<comment>{0})|(?P<string>{1})|(?P<number>{2})|(?P<identifier>{3})|(?P<operator>\\S)'.format(
+        COMMENTS.get(language, '(?!)'), STRING, NUMBER, IDENTIFIER), re.DOTALL)
+    for language in KEYWORDS
+}
+WORD = re.compile(r'\w+')
+
+EXTENSIONS = {
+    '.c': 'c', '.h': 'c',
+    '.cc': 'cc', '.cpp': 'cc', '.cxx': 'cc', '.hh': 'cc', '.hpp': 'cc',
+    '.java': 'java',
+    '.pas': 'pascal',
+    '.hs': 'haskell',
+    '.f': 'fortran', '.f90': 'fortran', '.for': 'fortran',
+    '.pl': 'perl', '.pm': 'perl',
+    '.m': 'matlab',
+    '.py': 'python',
+    '.js': 'javascript',
+    '.txt': 'ascii',
+}
+
+
+def tokenize(text, language):
+    """Tokens of a source file as (token, line) with comments dropped and names, numbers and strings made alike.
+
+    Renaming variables or changing literals leaves the tokens of a copy unchanged.
+    """
+    line = 1
+    position = 0
+    if language not in TOKEN:
+        for word in WORD.finditer(text):
+            line += text.count('\n', position, word.start())
+            position = word.start()
+            yield word.group().lower(), line
+        return
+    keywords = KEYWORDS[language]
+    for token in TOKEN[language].finditer(text):
+        line += text.count('\n', position, token.start())
+        position = token.start()
+        kind = token.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'identifier':
+            value = token.group().lower() if language in CASE_INSENSITIVE else token.group()
+            yield (value if value in keywords else 'V'), line
+        elif kind == 'string':
+            yield 'S', line
+        elif kind == 'number':
+            yield 'N', line
+        else:
+            yield token.group(), line
+
+
+def kgram_hash(tokens):
+    digest = hashlib.blake2b('\0'.join(tokens).encode(), digest_size=8).digest()
+    # Signed so it survives a round trip through JSON and bigint columns alike
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def winnow(kgrams, window):
+    """Smallest hash of every window of consecutive k-grams, the rightmost on ties, each position kept once.
+
+    Any stretch of window + k - 1 tokens shared by two files gives both at least one common fingerprint.
+    """
+    selected = []
+    last = None
+    for start in range(max(len(kgrams) - window + 1, 1 if kgrams else 0)):
+        chunk = kgrams[start:start + window]
+        index = start + min(range(len(chunk)),
+                            key=lambda i: (chunk[i][0], -i))
+        if index != last:
+            selected.append(kgrams[index])
+            last = index
+    return selected
+
+
+def fingerprint_file(file_pk, text, language, k, window):
+    tokens = list(tokenize(text, language))
+    kgrams = [
+        (kgram_hash([token for token, _ in tokens[i:i + k]]), file_pk, tokens[i][1], tokens[i + k - 1][1])
+        for i in range(len(tokens) - k + 1)
+    ]
+    return [list(kgram) for kgram in winnow(kgrams, window)]
+
+
+def read_text(file):
+    with open(file_cache.path(file), 'rb') as source:
+        return source.read().decode('utf-8', 'ignore')
+
+
+def in_thread(function):
+    def run(*args):
+        try:
+            return function(*args)
+        finally:
+            connection.close()
+    return run
+
+
+def fetch(function, items):
+    # Storage reads wait on the network, so a bounded number of them run at once
+    return list(fetch_executor.map(in_thread(function), items))
+
+
+def fingerprint_submission(submission, language, texts):
+    fingerprints = []
+    for file in submission.files.all():
+        fingerprints += fingerprint_file(file.pk, texts[file.pk], language,
+                                         settings.PLAGIARISM_KGRAM, settings.PLAGIARISM_WINDOW)
+    return fingerprints
+
+
+def guess_language(files):
+    languages = Counter(EXTENSIONS.get(os.path.splitext(file.filename)[1].lower()) for file in files)
+    languages.pop(None, None)
+    return languages.most_common(1)[0][0] if languages else None
+
+
+def index(submissions, language):
+    """Fingerprints of the submissions, computed only for those not yet in the assignment's index."""
+    indexed = dict(Fingerprint.objects.filter(
+        submission__in=submissions, language=language
+    ).values_list('submission_id', 'fingerprints'))
+    missing = [submission for submission in submissions if submission.pk not in indexed]
+    files = [file for submission in missing for file in submission.files.all()]
+    texts = dict(zip([file.pk for file in files], fetch(read_text, files)))
+    for submission in missing:
+        fingerprint, _ = Fingerprint.objects.get_or_create(
+            submission=submission, language=language, defaults={
+                'assignment_id': submission.assignment_id,
+                'fingerprints': fingerprint_submission(submission, language, texts),
+            }
+        )
+        indexed[submission.pk] = fingerprint.fingerprints
+    return indexed
+
+
+def compare(indexed, max_shared, limit):
+    """Pairs of submissions sharing fingerprints, most similar first.
+
+    Fingerprints found in more than max_shared submissions are treated as
+    starter code or common idiom and ignored.
+    """
+    owners = defaultdict(set)
+    for submission_pk, fingerprints in indexed.items():
+        for fingerprint in fingerprints:
+            owners[fingerprint[0]].add(submission_pk)
+    shared = defaultdict(set)
+    for fingerprint, submission_pks in owners.items():
+        if 1 < len(submission_pks) <= max_shared:
+            for pair in combinations(sorted(submission_pks), 2):
+                shared[pair].add(fingerprint)
+    distinct = {
+        submission_pk: len(set(fingerprint[0] for fingerprint in fingerprints)) for submission_pk, fingerprints in indexed.items()
+    }
+    pairs = []
+    for (a, b), fingerprints in shared.items():
+        pairs.append({
+            'a': a,
+            'b': b,
+            'shared': len(fingerprints),
+            'a_percent': round(100 * len(fingerprints) / distinct[a]),
+            'b_percent': round(100 * len(fingerprints) / distinct[b]),
+            'a_lines': matched_lines(indexed[a], fingerprints),
+            'b_lines': matched_lines(indexed[b], fingerprints),
+        })
+    pairs.sort(key=lambda pair: (-max(pair['a_percent'], pair['b_percent']), -pair['shared']))
+    return pairs[:limit]
+
+
+def matched_lines(fingerprints, shared):
+    # Line ranges per file, merged where the matching k-grams overlap
+    ranges = defaultdict(list)
+    for fingerprint, file_pk, first, last in sorted(fingerprints, key=lambda fingerprint: (fingerprint[1], fingerprint[2])):
+        if fingerprint not in shared:
+            continue
+        file_ranges = ranges[str(file_pk)]
+        if file_ranges and first <= file_ranges[-1][1] + 1:
+            file_ranges[-1][1] = max(file_ranges[-1][1], last)
+        else:
+            file_ranges.append([first, last])
+    return ranges
+
+
+def latest_submissions(assignment, enrolled_class):
+    # Assignments can be shared between classes, a report only covers the class it was run for
+    return list(Submission.objects.filter(assignment=assignment, enrolled_class=enrolled_class).order_by(
+        'submitter', '-timestamp').distinct('submitter').select_related('submitter').prefetch_related('files'))
+
+
+def build_report(report, submissions):
+    indexed = index(submissions, report.language)
+    report.pairs = compare(indexed, settings.PLAGIARISM_MAX_SHARED, settings.PLAGIARISM_REPORT_PAIRS)
+    report.submissions = len(indexed)
+    report.save(update_fields=['pairs', 'submissions'])
+
+
+def send_to_moss(report, submissions):
+    moss = mosspy.Moss(settings.MOSS_ID, report.language)
+    moss.server = settings.MOSS_SERVER
+    moss.port = settings.MOSS_PORT
+    with tempfile.TemporaryDirectory() as directory:
+        files = [
+            (file, '{0}_{1}'.format(submission.submitter.username, file.filename))
+            for submission in submissions for file in submission.files.all()
+        ]
+        fetch(lambda item: file_cache.copy(item[0], directory, item[1]), files)
+        moss.addFilesByWildcard(os.path.join(directory, '*'))
+        report.url = moss.send()
+    report.submissions = len(submissions)
+    report.save(update_fields=['url', 'submissions'])
+
+
+def run(report):
+    submissions = latest_submissions(report.assignment, report.enrolled_class)
+    if report.engine == PlagiarismReport.Engine.MOSS:
+        send_to_moss(report, submissions)
+    else:
+        build_report(report, submissions)
+
+
+fetch_executor = ThreadPoolExecutor(
+    max_workers=settings.PLAGIARISM_FETCH_CONCURRENCY)
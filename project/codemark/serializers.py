@@ -6,13 +6,13 @@ from .models import Result, LevelOutput, StepOutput, RunStepOutput, TestStepOutp
 class TestStepOutputSerializer(serializers.ModelSerializer):
     class Meta:
         model = TestStepOutput
-        exclude = ('number',)
+        exclude = ('number', 'actual_output_file')
 
 
 class RunStepOutputSerializer(serializers.ModelSerializer):
     class Meta:
         model = RunStepOutput
-        exclude = ('number',)
+        exclude = ('number', 'stdout_file', 'stderr_file')
 
 
 class StepOutputSerializer(serializers.ModelSerializer):
@@ -42,4 +42,75 @@ class ResultSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Result
-        fields = '__all__'
+        # Grades add up hidden levels, the socket sends results to students as is
+        exclude = ('score', 'max_score', 'level_scores', 'fingerprint', 'rerun')
+
+
+# The serializers above resolve fields and dispatch on the polymorphic type for
+# every object. serialize_result loads each step output table once and walks the
+# rows with a plan built once per serializer from the same fields, so the output
+# is identical.
+
+def field_plan(serializer_class):
+    plan = []
+    model = serializer_class.Meta.model
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, serializers.BaseSerializer):
+            plan.append((name, None, None))
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            plan.append((name, model._meta.get_field(name).attname, None))
+        else:
+            plan.append((name, field.source, field.to_representation))
+    return plan
+
+
+step_output_plans = {
+    model: field_plan(serializer_class) for model, serializer_class in StepOutputPolymorphicSerializer.model_serializer_mapping.items()
+}
+level_output_plan = field_plan(LevelOutputSerializer)
+result_plan = field_plan(ResultSerializer)
+
+
+def represent(instance, plan, nested=None):
+    data = {}
+    for name, attribute, to_representation in plan:
+        if attribute is None:
+            data[name] = nested
+            continue
+        value = getattr(instance, attribute)
+        if value is not None and to_representation:
+            value = to_representation(value)
+        data[name] = value
+    return data
+
+
+def serialize_step_output(step_output):
+    data = represent(step_output, step_output_plans[type(step_output)])
+    data['resourcetype'] = type(step_output).__name__
+    return data
+
+
+def serialize_result(result):
+    """Same data as ResultSerializer(result).data, from a fixed number of queries."""
+    level_outputs = list(result.level_outputs.all())
+    links = {}
+    for level_output_pk, step_output_pk in LevelOutput.step_outputs.through.objects.filter(
+            leveloutput__in=level_outputs).values_list('leveloutput_id', 'stepoutput_id'):
+        links.setdefault(level_output_pk, []).append(step_output_pk)
+    step_outputs = {}
+    order = {}
+    for model in (RunStepOutput, TestStepOutput):
+        for step_output in model.objects.non_polymorphic().filter(leveloutput__in=level_outputs):
+            step_outputs[step_output.pk] = serialize_step_output(step_output)
+            order[step_output.pk] = step_output.number
+    missing = [pk for pks in links.values()
+               for pk in pks if pk not in step_outputs]
+    if missing:
+        for step_output in StepOutput.objects.filter(pk__in=missing):
+            step_outputs[step_output.pk] = serialize_step_output(step_output)
+            order[step_output.pk] = step_output.number
+    return represent(result, result_plan, [
+        represent(level_output, level_output_plan, [
+            step_outputs[pk] for pk in sorted(links.get(level_output.pk, []), key=lambda pk: (order[pk], pk))
+        ]) for level_output in level_outputs
+    ])
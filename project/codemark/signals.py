@@ -0,0 +1,95 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Step, Level, Assignment, StepOutput, Result, Class, File
+from . import membership
+
+
+@receiver(post_save)
+def update_result_grades(sender, instance, update_fields, **kwargs):
+    # Grading runs save only their output fields, so any other save may have changed a weight
+    if not isinstance(instance, StepOutput):
+        return
+    if update_fields is not None and 'weight' not in update_fields:
+        return
+    for result in Result.objects.filter(level_outputs__step_outputs=instance).exclude(score=None):
+        result.update_grade()
+
+
+@receiver(post_save)
+def update_step_output_weights(sender, instance, update_fields, **kwargs):
+    # Results keep their own copy of each weight, so a changed step weight is copied over and regraded
+    if not isinstance(instance, Step):
+        return
+    if update_fields is not None and 'weight' not in update_fields:
+        return
+    step_outputs = StepOutput.objects.filter(step=instance).exclude(weight=instance.weight)
+    results = list(Result.objects.filter(
+        level_outputs__step_outputs__in=step_outputs.values('pk')).exclude(score=None).distinct())
+    step_outputs.update(weight=instance.weight)
+    for result in results:
+        result.update_grade()
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+@receiver(m2m_changed, sender=Class.instructors.through)
+def invalidate_membership(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':
+        # The removed rows are gone after the clear, so read them first
+        field = 'user_id' if reverse else 'class_id'
+        pk_set = set(sender.objects.filter(
+            **{field: instance.pk}).values_list('class_id' if reverse else 'user_id', flat=True))
+    if reverse:
+        membership.invalidate([instance.pk], pk_set)
+    else:
+        membership.invalidate(pk_set, [instance.pk])
+
+
+@receiver(post_save)
+@receiver(pre_delete)
+def clear_step_points(sender, instance, **kwargs):
+    if isinstance(instance, Step):
+        Assignment.objects.filter(levels__steps=instance).update(points=None)
+
+
+@receiver(post_save, sender=Level)
+@receiver(pre_delete, sender=Level)
+def clear_level_points(sender, instance, **kwargs):
+    Assignment.objects.filter(levels=instance).update(points=None)
+
+
+@receiver(post_save, sender=Assignment)
+def clear_assignment_points(sender, instance, **kwargs):
+    Assignment.objects.filter(pk=instance.pk).update(points=None)
+
+
+@receiver(m2m_changed, sender=Level.steps.through)
+def clear_level_steps_points(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        Assignment.objects.filter(levels=instance).update(points=None)
+    elif pk_set is None:
+        Assignment.objects.filter(levels__steps=instance).update(points=None)
+    else:
+        Assignment.objects.filter(levels__in=pk_set).update(points=None)
+
+
+@receiver(m2m_changed, sender=Assignment.levels.through)
+def clear_assignment_levels_points(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        Assignment.objects.filter(pk=instance.pk).update(points=None)
+    elif pk_set is None:
+        Assignment.objects.filter(levels=instance).update(points=None)
+    else:
+        Assignment.objects.filter(pk__in=pk_set).update(points=None)
+
+
+@receiver(post_delete, sender=File)
+def release_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        instance.blob.release()
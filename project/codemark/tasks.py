@@ -1,136 +1,438 @@
 # Create your tasks here
 
 import time
-import tempfile
-import signal
-import docker
-from celery import shared_task
+import threading
+import gzip
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from celery import shared_task, group, chain
+from celery.signals import worker_process_init, worker_process_shutdown, task_postrun
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from json import dumps
 
 
-from .models import User, Submission, RunStep, TestStep, Result, LevelOutput, RunStepOutput, TestStepOutput
-from .serializers import ResultSerializer
+from .models import User, Submission, Level, Step, RunStep, TestStep, Result, LevelOutput, StepOutput, RunStepOutput, TestStepOutput, Rerun, PlagiarismReport
+from .serializers import serialize_step_output
+from .containers import container_pool
+from .cache import file_cache
+from .execution import exec_command, OutputBuffer
+from .diff import diff
+from .matchers import REGEX
+from .metrics import timed
+from . import metrics
+from . import plagiarism
 
 
-# Custom exception class
-class TimeoutException(Exception):
-    pass
+level_executor = ThreadPoolExecutor(max_workers=settings.LEVEL_CONCURRENCY)
+update_lock = threading.Lock()
 
 
-# Custom signal handler
-def timeout_handler(signum, frame):
-    raise TimeoutException
+@worker_process_init.connect
+def prewarm_containers(**kwargs):
+    for image, count in settings.CONTAINER_POOL_PREWARM.items():
+        container_pool.prewarm(image, count)
 
 
-def send_submission_update(result):
+@worker_process_shutdown.connect
+def drain_containers(**kwargs):
+    container_pool.drain()
+    metrics.flush()
+
+
+@task_postrun.connect
+def flush_metrics(**kwargs):
+    metrics.flush()
+
+
+def step_labels(result, level_output, step_output):
+    return {
+        'assignment': result.submission.assignment_id,
+        'level': level_output.name,
+        'image': level_output.container,
+        'step_type': type(step_output).__name__,
+    }
+
+
+def save_step_output(result, level_output, step_output):
+    layer = get_channel_layer()
+    labels = step_labels(result, level_output, step_output)
+    # Versions are bumped and sent in order so clients can detect a missed delta
+    with update_lock:
+        with timed('db_save', **labels), transaction.atomic():
+            step_output.save(update_fields=step_output.output_fields)
+            result.version += 1
+            result.save(update_fields=['version'])
+        with timed('serialize', **labels):
+            step = serialize_step_output(step_output)
+        with timed('broadcast', **labels):
+            async_to_sync(layer.group_send)(
+                'submission_%s' % result.submission.pk, {
+                    'type': 'delta',
+                    'result': result.pk,
+                    'version': result.version,
+                    'level': {
+                        'id': level_output.pk,
+                        'name': level_output.name,
+                        'container': level_output.container,
+                    },
+                    'step': step,
+                }
+            )
+
+
+def send_step_output(result, step_output, stream, data):
     layer = get_channel_layer()
-    data = ResultSerializer(result).data
     async_to_sync(layer.group_send)(
         'submission_%s' % result.submission.pk, {
-            'type': 'update', 'data': data
+            'type': 'output', 'step': step_output.pk, 'hidden': step_output.hidden, 'stream': stream, 'data': data
         }
     )
 
 
+def step_output_buffer(result, step_output):
+    return OutputBuffer(
+        lambda stream, data: send_step_output(
+            result, step_output, stream, data),
+        settings.OUTPUT_STREAM_SIZE,
+        settings.OUTPUT_STREAM_INTERVAL
+    )
+
+
 @shared_task
 def execute_result(result_pk):
-    signal.signal(signal.SIGALRM, timeout_handler)
-    result = Result.objects.get(pk=result_pk)
-    for level_output in result.level_outputs.all():
-        dir = tempfile.TemporaryDirectory()
-        if result.submission.assignment.fixture:
-            for file in result.submission.assignment.fixture.files.all():
-                file.copy(dir.name)
-        for file in result.submission.files.all():
-            file.copy(dir.name)
-        client = docker.from_env()
-        container = client.containers.run(level_output.container, detach=True, auto_remove=True, tty=True, stdout=True, stderr=True, volumes={
-            dir.name: {
-                'bind': '/tmp',
-                'mode': 'rw',
-            }
-        })
-        for step_output in level_output.step_outputs.all():
-            if isinstance(step_output, RunStepOutput):
-                signal.alarm(int(step_output.timeout.total_seconds()))
-                res = None
-                stdout = ''
-                stderr = ''
-                timed_out = False
-                try:
-                    res = container.exec_run(
-                        'bash -c "{0}"'.format(step_output.command.replace('"', '\\"')), workdir='/tmp', demux=True
-                    )
-                except TimeoutException:
-                    timed_out = True
-                    pass
-                signal.alarm(0)
-                if res and res.output[0]:
-                    stdout = res.output[0].decode('utf-8', 'ignore')
-                if res and res.output[1]:
-                    stderr = res.output[1].decode('utf-8', 'ignore')
-                step_output.stdout = stdout
-                step_output.stderr = stderr
-                step_output.timed_out = timed_out
+    result = Result.objects.select_related(
+        'submission__assignment__fixture').get(pk=result_pk)
+    with timed('execute', assignment=result.submission.assignment_id):
+        run_or_clone(result)
+
+
+def clone_source(result):
+    # A timeout or cut off output may come from load rather than the code, so those runs are never copied
+    interrupted = StepOutput.objects.filter(leveloutput__result=OuterRef('pk')).filter(
+        Q(runstepoutput__timed_out=True) | Q(runstepoutput__truncated=True) |
+        Q(teststepoutput__timed_out=True) | Q(teststepoutput__truncated=True)
+    )
+    return Result.objects.filter(fingerprint=result.fingerprint).filter(
+        status=Result.Status.FINISHED).exclude(pk=result.pk).exclude(
+        Exists(interrupted)).order_by('-timestamp').first()
+
+
+def run_or_clone(result):
+    assignment = result.submission.assignment_id
+    result.status = Result.Status.RUNNING
+    result.save(update_fields=['status'])
+    try:
+        with timed('fingerprint', assignment=assignment):
+            result.fingerprint = result_fingerprint(result)
+            result.save(update_fields=['fingerprint'])
+            source = None
+            if not result.submission.assignment.nondeterministic:
+                source = clone_source(result)
+        if source:
+            with timed('clone', assignment=assignment):
+                clone_result(source, result)
+        else:
+            run_result(result)
+    except Exception:
+        with timed('grade', assignment=assignment):
+            result.update_grade()
+        result.status = Result.Status.FAILED
+        result.save(update_fields=['status'])
+        raise
+    with timed('grade', assignment=assignment):
+        result.update_grade()
+    result.status = Result.Status.FINISHED
+    result.save(update_fields=['status'])
+
+
+def result_fingerprint(result):
+    # Everything that can change what the steps print; weights and names only change grading
+    assignment = result.submission.assignment
+    fixture_files = assignment.fixture.files.all() if assignment.fixture else []
+    data = {
+        'fixture': sorted([file.filename, file_cache.hash(file)] for file in fixture_files),
+        'files': sorted([file.filename, file_cache.hash(file)] for file in result.submission.files.all()),
+        'carry_workspace': assignment.carry_workspace,
+        'levels': [[
+            level_output.container,
+            [[type(step_output).__name__, getattr(step_output, 'command', None), str(getattr(step_output, 'timeout', None))]
+             for step_output in level_output.step_outputs.order_by('number', 'pk')]
+        ] for level_output in result.level_outputs.order_by('pk')],
+    }
+    return hashlib.sha256(dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def clone_result(source, result):
+    source_levels = source.level_outputs.order_by('pk')
+    for source_level, level_output in zip(source_levels, result.level_outputs.order_by('pk')):
+        source_steps = source_level.step_outputs.order_by('number', 'pk')
+        for source_step, step_output in zip(source_steps, level_output.step_outputs.order_by('number', 'pk')):
+            for field in step_output.output_fields:
+                setattr(step_output, field, getattr(source_step, field))
+            # The fingerprint leaves out expected output and matchers, so the copy is graded against its own
             if isinstance(step_output, TestStepOutput):
-                signal.alarm(int(step_output.timeout.total_seconds()))
-                res = None
-                actual_output = ''
-                timed_out = False
-                try:
-                    res = container.exec_run(
-                        'bash -c "{0}"'.format(step_output.command.replace('"', '\\"')), workdir='/tmp'
-                    )
-                except TimeoutException:
-                    timed_out = True
-                    pass
-                signal.alarm(0)
-                if res and res.output:
-                    actual_output = res.output.decode('utf-8', 'ignore')
-                step_output.actual_output = actual_output
-                step_output.timed_out = timed_out
-
-            step_output.save()
-            send_submission_update(result)
-
-        container.stop()
-        dir.cleanup()
+                evaluate_test_output(step_output, step_output.full_output())
+            save_step_output(result, level_output, step_output)
+
+
+def run_result(result):
+    chains = level_chains(result.submission.assignment,
+                          result.level_outputs.order_by('pk'))
+    if result.submission.assignment.parallel_levels:
+        futures = [level_executor.submit(run_chain_in_thread, result, level_chain)
+                   for level_chain in chains]
+        for future in futures:
+            future.result()
+    else:
+        for level_chain in chains:
+            run_chain(result, level_chain)
+
+
+def level_chains(assignment, level_outputs):
+    # Consecutive levels sharing an image run in one container when the workspace is carried forward
+    chains = []
+    for level_output in level_outputs:
+        if assignment.carry_workspace and chains and chains[-1][-1].container == level_output.container:
+            chains[-1].append(level_output)
+        else:
+            chains.append([level_output])
+    return chains
+
+
+def run_chain_in_thread(result, level_outputs):
+    try:
+        run_chain(result, level_outputs)
+    finally:
+        connection.close()
+
+
+def run_chain(result, level_outputs):
+    labels = {
+        'assignment': result.submission.assignment_id,
+        'image': level_outputs[0].container,
+    }
+    with timed('container_start', **labels):
+        pooled = container_pool.acquire(level_outputs[0].container)
+    try:
+        with timed('files', **labels):
+            if result.submission.assignment.fixture:
+                for file in result.submission.assignment.fixture.files.all():
+                    file_cache.copy(file, pooled.workspace)
+            for file in result.submission.files.all():
+                file_cache.copy(file, pooled.workspace)
+        for level_output in level_outputs:
+            run_level(result, level_output, pooled)
+    finally:
+        with timed('container_release', **labels):
+            container_pool.release(pooled)
+
+
+def store_output(step_output, stream, data):
+    # Outputs too long to keep inline go to storage compressed, the row keeps a preview
+    if not data:
+        return ''
+    if len(data) <= settings.OUTPUT_INLINE_LIMIT:
+        return data.decode('utf-8', 'ignore')
+    getattr(step_output, step_output.stream_fields[stream]).save(
+        'output/{0}/{1}.gz'.format(step_output.pk, stream), ContentFile(gzip.compress(data)), save=False
+    )
+    step_output.offloaded = True
+    return data[:settings.OUTPUT_INLINE_LIMIT].decode('utf-8', 'ignore')
+
+
+def run_level(result, level_output, pooled):
+    container = pooled.container
+    for step_output in level_output.step_outputs.order_by('number', 'pk'):
+        step_output.offloaded = False
+        labels = step_labels(result, level_output, step_output)
+        if isinstance(step_output, RunStepOutput):
+            with timed('exec', **labels):
+                res = exec_command(
+                    container, step_output.command, step_output.timeout, demux=True, output=step_output_buffer(
+                        result, step_output), limit=settings.OUTPUT_CAPTURE_LIMIT
+                )
+            stdout, stderr = res.output or (None, None)
+            step_output.stdout = store_output(step_output, 'stdout', stdout)
+            step_output.stderr = store_output(step_output, 'stderr', stderr)
+            step_output.timed_out = res.timed_out
+            step_output.runtime = res.runtime
+            step_output.truncated = res.truncated
+        if isinstance(step_output, TestStepOutput):
+            with timed('exec', **labels):
+                res = exec_command(
+                    container, step_output.command, step_output.timeout, output=step_output_buffer(
+                        result, step_output), limit=settings.OUTPUT_CAPTURE_LIMIT
+                )
+            step_output.actual_output = store_output(
+                step_output, 'output', res.output)
+            step_output.timed_out = res.timed_out
+            evaluate_test_output(step_output, res.output.decode(
+                'utf-8', 'ignore') if step_output.offloaded else step_output.actual_output)
+            step_output.runtime = res.runtime
+            step_output.truncated = res.truncated
+
+        save_step_output(result, level_output, step_output)
+
+
+def evaluate_test_output(step_output, actual):
+    step_output.evaluate(actual)
+    step_output.diff = None
+    # A pattern has no lines to line up with the output
+    if not step_output.offloaded and not step_output.timed_out and step_output.matcher != REGEX \
+            and len(step_output.expected_output) <= settings.OUTPUT_INLINE_LIMIT:
+        step_output.diff = diff(step_output.expected_output, step_output.actual_output, step_output.case_insensitive,
+                                step_output.strip_whitespace, settings.DIFF_TOKEN_LIMIT, settings.DIFF_MAX_COST)
+
+
+def scaffold_step_output(step):
+    if isinstance(step, RunStep):
+        step_output = RunStepOutput()
+        step_output.command = step.command
+        step_output.timeout = step.timeout
+        step_output.stdout = None
+        step_output.stderr = None
+        step_output.timed_out = None
+    elif isinstance(step, TestStep):
+        step_output = TestStepOutput()
+        step_output.command = step.command
+        step_output.timeout = step.timeout
+        step_output.expected_output = step.expected_output
+        step_output.case_insensitive = step.case_insensitive
+        step_output.strip_whitespace = step.strip_whitespace
+        step_output.matcher = step.matcher
+        step_output.tolerance = step.tolerance
+        step_output.actual_output = None
+        step_output.timed_out = None
+    step_output.name = step.name
+    step_output.number = step.number
+    step_output.weight = step.weight
+    step_output.hidden = step.hidden
+    step_output.step = step
+    return step_output
+
+
+def bulk_create_step_outputs(step_outputs):
+    # bulk_create refuses multi-table children, so parent rows go first and child rows are inserted directly
+    parents = [StepOutput(
+        name=step_output.name,
+        number=step_output.number,
+        weight=step_output.weight,
+        hidden=step_output.hidden,
+        step_id=step_output.step_id,
+        polymorphic_ctype=ContentType.objects.get_for_model(
+            type(step_output), for_concrete_model=False)
+    ) for step_output in step_outputs]
+    StepOutput.objects.bulk_create(parents)
+    for parent, step_output in zip(parents, step_outputs):
+        step_output.id = step_output.stepoutput_ptr_id = parent.pk
+        step_output.polymorphic_ctype_id = parent.polymorphic_ctype_id
+    for model in (RunStepOutput, TestStepOutput):
+        children = [step_output for step_output in step_outputs if type(step_output) is model]
+        if children:
+            model._base_manager._insert(
+                children, fields=model._meta.local_concrete_fields)
+
+
+def create_result(submission_object, rerun=None):
+    levels = list(submission_object.assignment.levels.order_by('pk'))
+    level_steps = Level.steps.through.objects.filter(level__in=levels)
+    steps = Step.objects.in_bulk([level_step.step_id for level_step in level_steps])
+    with transaction.atomic():
+        result = Result()
+        result.submission = submission_object
+        result.rerun = rerun
+        result.save()
+        level_outputs = [LevelOutput(name=level.name, container=level.container) for level in levels]
+        LevelOutput.objects.bulk_create(level_outputs)
+        Result.level_outputs.through.objects.bulk_create([
+            Result.level_outputs.through(result=result, leveloutput=level_output) for level_output in level_outputs
+        ])
+        step_outputs = []
+        links = []
+        for level, level_output in zip(levels, level_outputs):
+            level_step_list = sorted((steps[level_step.step_id] for level_step in level_steps if level_step.level_id == level.pk),
+                                     key=lambda step: (step.number, step.pk))
+            for step in level_step_list:
+                step_output = scaffold_step_output(step)
+                step_outputs.append(step_output)
+                links.append((level_output, step_output))
+        bulk_create_step_outputs(step_outputs)
+        LevelOutput.step_outputs.through.objects.bulk_create([
+            LevelOutput.step_outputs.through(leveloutput=level_output, stepoutput_id=step_output.pk) for level_output, step_output in links
+        ])
+        submission_object.current_result = result
+        submission_object.save(update_fields=['current_result'])
+    return result
+
+
+@shared_task
+def scaffold_result(submission_pk):
+    submission_object = Submission.objects.select_related(
+        'assignment').get(pk=submission_pk)
+    with timed('scaffold', assignment=submission_object.assignment_id):
+        result = create_result(submission_object)
+    layer = get_channel_layer()
+    with timed('broadcast', assignment=submission_object.assignment_id):
+        async_to_sync(layer.group_send)(
+            'submission_%s' % submission_pk, {'type': 'refresh'}
+        )
+    return result.pk
 
 
 def trigger_run(submission_object):
-    result = Result()
-    result.submission = submission_object
-    result.save()
-    for level in submission_object.assignment.levels.all():
-        level_output = LevelOutput()
-        level_output.name = level.name
-        level_output.save()
-        for step in level.steps.all():
-            if isinstance(step, RunStep):
-                step_output = RunStepOutput()
-                step_output.command = step.command
-                step_output.timeout = step.timeout
-                step_output.stdout = None
-                step_output.stderr = None
-                step_output.timed_out = None
-            elif isinstance(step, TestStep):
-                step_output = TestStepOutput()
-                step_output.command = step.command
-                step_output.timeout = step.timeout
-                step_output.expected_output = step.expected_output
-                step_output.case_insensitive = step.case_insensitive
-                step_output.strip_whitespace = step.strip_whitespace
-                step_output.actual_output = None
-                step_output.timed_out = None
-            step_output.name = step.name
-            step_output.number = step.number
-            step_output.weight = step.weight
-            step_output.hidden = step.hidden
-            step_output.save()
-            level_output.step_outputs.add(step_output)
-        level_output.save()
-        result.level_outputs.add(level_output)
-    result.save()
-    execute_result.delay(result.pk)
+    with timed('trigger', assignment=submission_object.assignment_id):
+        chain(scaffold_result.s(submission_object.pk), execute_result.s()).delay()
+    metrics.flush()
+
+
+@shared_task
+def rerun_assignment(rerun_pk):
+    rerun = Rerun.objects.get(pk=rerun_pk)
+    submission_pks = list(Submission.objects.filter(assignment=rerun.assignment).filter(enrolled_class=rerun.enrolled_class).order_by(
+        'submitter', '-timestamp').distinct('submitter').values_list('pk', flat=True))
+    rerun.total = len(submission_pks)
+    rerun.save(update_fields=['total'])
+    for start in range(0, len(submission_pks), settings.RERUN_CHUNK_SIZE):
+        chunk = Submission.objects.filter(
+            pk__in=submission_pks[start:start + settings.RERUN_CHUNK_SIZE]).select_related('assignment')
+        with transaction.atomic():
+            results = [create_result(submission, rerun) for submission in chunk]
+        group(execute_result.s(result.pk) for result in results).apply_async()
+
+
+@shared_task
+def index_submission(submission_pk):
+    # Fingerprinted on arrival in the language its files look like, so reports only read the index
+    submission = Submission.objects.prefetch_related(
+        'files').get(pk=submission_pk)
+    language = plagiarism.guess_language(submission.files.all())
+    if language:
+        plagiarism.index([submission], language)
+
+
+def set_report_status(report, status):
+    report.status = status
+    report.save(update_fields=['status'])
+    layer = get_channel_layer()
+    async_to_sync(layer.group_send)(
+        'plagiarism_%s' % report.pk, {'type': 'status', 'status': status, 'url': report.url}
+    )
+
+
+@shared_task
+def run_plagiarism(report_pk):
+    report = PlagiarismReport.objects.select_related(
+        'assignment').get(pk=report_pk)
+    set_report_status(report, PlagiarismReport.Status.RUNNING)
+    try:
+        plagiarism.run(report)
+    except Exception:
+        set_report_status(report, PlagiarismReport.Status.FAILED)
+        raise
+    set_report_status(report, PlagiarismReport.Status.FINISHED)
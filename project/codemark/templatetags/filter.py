@@ -1,6 +1,8 @@
 from django import template
 from django.utils.safestring import mark_safe
 
+from codemark import membership
+
 register = template.Library()
 
 
@@ -25,38 +27,5 @@ def smooth_timedelta(timedeltaobj):
 
 
 @register.filter()
-def submitted_in(submissions, enrolled_class):
-    if submissions:
-        return submissions.filter(enrolled_class=enrolled_class)
-
-
-@register.filter()
-def submitted_by(submissions, user):
-    if submissions:
-        return submissions.filter(submitter=user)
-
-
-@register.filter()
-def latest(queryset):
-    if queryset:
-        return queryset.latest()
-
-
-@register.filter()
-def timestamp(submission):
-    if submission:
-        return submission.timestamp
-
-
-@register.filter()
-def grade(submission):
-    if submission and submission.latest_result:
-        return submission.latest_result.grade
-    else:
-        return ''
-
-
-@register.filter()
-def submittable(assignment, user):
-    if assignment:
-        return assignment.submittable(user)
+def instructs(user, enrolled_class):
+    return membership.is_instructor(user, enrolled_class)
@@ -1,3 +1,152 @@
-from django.test import TestCase
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from . import plagiarism, tasks
+from .cache import file_cache
+from .management.commands.moss_standin import MossStandIn
+from .models import (Assignment, Class, Course, Department, File,
+                     PlagiarismReport, Submission, User)
+
+
+SOURCE = '''
+def main():
+    total = 0
+    for number in range(10):
+        if number % 2:
+            total += number * number
+    print("total", total)
+'''
+
+
+async def received(layer, channel):
+    messages = []
+    while True:
+        try:
+            messages.append(await asyncio.wait_for(layer.receive(channel), 0.1))
+        except asyncio.TimeoutError:
+            return messages
+
+
+@override_settings(
+    DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    MOSS_SERVER='localhost',
+)
+class PlagiarismTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.addCleanup(shutil.rmtree, self.cache)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache = mock.patch.object(file_cache, 'directory', self.cache)
+        cache.start()
+        self.addCleanup(cache.stop)
+
+        self.server = MossStandIn(('localhost', 0), 'http://moss.test')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        moss = override_settings(MOSS_PORT=self.server.server_address[1])
+        moss.enable()
+        self.addCleanup(moss.disable)
+
+        self.instructor = User.objects.create(username='instructor', email='instructor@example.com')
+        department = Department.objects.create(name='Computer Science', abbreviation='CS')
+        course = Course.objects.create(name='Programming', number='101', department=department)
+        self.enrolled_class = Class.objects.create(term=Class.Term.FALL, year=2020, section='1', course=course)
+        self.assignment = Assignment.objects.create(creator=self.instructor, name='Loops')
+        self.enrolled_class.assignments.add(self.assignment)
+        self.files = 0
+        for number in range(3):
+            student = User.objects.create(username='student%d' % number, email='student%d@example.com' % number)
+            submission = Submission.objects.create(
+                submitter=student, assignment=self.assignment, enrolled_class=self.enrolled_class
+            )
+            for name in ('main.py', 'util.py'):
+                file = File(creator=student, file=SimpleUploadedFile(name, (SOURCE + '# %d\n' % number).encode()))
+                file.save()
+                submission.files.add(file)
+                self.files += 1
+
+    def report(self, engine):
+        return PlagiarismReport.objects.create(
+            creator=self.instructor, assignment=self.assignment, enrolled_class=self.enrolled_class,
+            language='python', engine=engine
+        )
+
+    def run_report(self, report):
+        # Listen on the report's group the way PlagiarismConsumer does
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('plagiarism_%s' % report.pk, channel)
+        try:
+            tasks.run_plagiarism(report.pk)
+        finally:
+            report.refresh_from_db()
+            self.messages = async_to_sync(received)(layer, channel)
+            self.statuses = [message['status'] for message in self.messages]
+
+    def test_moss_report(self):
+        report = self.report(PlagiarismReport.Engine.MOSS)
+        self.run_report(report)
+        self.assertEqual(report.status, PlagiarismReport.Status.FINISHED)
+        self.assertEqual(report.url, 'http://moss.test/results/1')
+        self.assertEqual(report.submissions, 3)
+        self.assertEqual(self.server.queries, [self.files])
+        self.assertEqual(self.statuses, [PlagiarismReport.Status.RUNNING, PlagiarismReport.Status.FINISHED])
+        self.assertEqual(self.messages[-1]['url'], report.url)
+
+    def test_moss_unreachable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        report = self.report(PlagiarismReport.Engine.MOSS)
+        with self.assertRaises(OSError):
+            self.run_report(report)
+        self.assertEqual(report.status, PlagiarismReport.Status.FAILED)
+        self.assertEqual(self.statuses, [PlagiarismReport.Status.RUNNING, PlagiarismReport.Status.FAILED])
+
+    def test_local_report(self):
+        report = self.report(PlagiarismReport.Engine.LOCAL)
+        self.run_report(report)
+        self.assertEqual(report.status, PlagiarismReport.Status.FINISHED)
+        self.assertEqual(report.submissions, 3)
+        self.assertEqual(len(report.pairs), 3)
+        self.assertEqual(self.statuses, [PlagiarismReport.Status.RUNNING, PlagiarismReport.Status.FINISHED])
+
+    def test_fetch_is_bounded(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        copy = file_cache.copy
+
+        def slow_copy(*args):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                time.sleep(0.05)
+                return copy(*args)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(plagiarism, 'fetch_executor', executor), \
+                mock.patch.object(file_cache, 'copy', slow_copy):
+            self.run_report(self.report(PlagiarismReport.Engine.MOSS))
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(self.server.queries, [self.files])
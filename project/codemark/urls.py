@@ -11,6 +11,7 @@ urlpatterns = [
     path('unenroll/<slug:class_pk>/', views.unenroll_view, name='unenroll'),
     path('class/<slug:class_pk>/', views.class_view, name='class'),
     path('grades/<slug:class_pk>/', views.grades_view, name='grades'),
+    path('download_grades/<slug:class_pk>/', views.download_grades_view, name='download_class_grades'),
     path('download_grades/<slug:class_pk>/<slug:assignment_pk>/', views.download_grades_view, name='download_grades'),
     path('class_assignments_update/<slug:pk>/', views.ClassAssignmentsUpdateView.as_view(), name='class_assignments_update'),
     path('assignment/create/', views.AssignmentCreateView.as_view(), name='assignment_create'),
@@ -41,9 +42,14 @@ urlpatterns = [
     path('text/delete/<slug:pk>/', views.TextDeleteView.as_view(), name='text_delete'),
     path('submit/<slug:class_pk>/<slug:assignment_pk>/', views.submit_view, name='submit'),
     path('submission/<slug:submission_pk>/', views.submission_view, name='submission'),
+    path('step_output/<slug:step_output_pk>/<slug:stream>/', views.step_output_view, name='step_output'),
     path('run_submission/<slug:submission_pk>/', views.run_submission_view, name='run_submission'),
     path('run_assignment/<slug:class_pk>/<slug:assignment_pk>/', views.run_assignment_view, name='run_assignment'),
+    path('rerun_progress/<slug:rerun_pk>/', views.rerun_progress_view, name='rerun_progress'),
     path('plagiarism/<slug:class_pk>/<slug:assignment_pk>/', views.plagiarism_view, name='plagiarism'),
+    path('plagiarism_report/<slug:report_pk>/', views.plagiarism_report_view, name='plagiarism_report'),
+    path('plagiarism_report/<slug:report_pk>/<int:pair>/', views.plagiarism_pair_view, name='plagiarism_pair'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('login/', auth_views.LoginView.as_view(), name='login'),
     path('password_reset', auth_views.PasswordResetView.as_view(template_name='password_reset/request.html', subject_template_name='password_reset/subject.txt', html_email_template_name='password_reset/email.html'), name='password_reset'),
     path('password_reset/done/', auth_views.PasswordResetDoneView.as_view(template_name='password_reset/done.html'), name='password_reset_done'),
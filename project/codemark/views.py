@@ -5,19 +5,20 @@ from django.contrib.auth import logout
 from django.forms import formset_factory
 from django.core import serializers
 from django.conf import settings
-from django.http import Http404, JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.generic.edit import CreateView, UpdateView, FormView, DeleteView, FormMixin, DeletionMixin
 from django_addanother.views import CreatePopupMixin, UpdatePopupMixin
 from verify_email.email_handler import send_verification_email
-import csv
-import mosspy
-import os
-import tempfile
+import gzip
 
 
 from . import forms
+from . import membership
+from . import metrics
 from . import models
-from .tasks import trigger_run
+from . import plagiarism
+from .gradebook import Gradebook, export_rows
+from .tasks import trigger_run, rerun_assignment, index_submission, run_plagiarism
 
 
 def logout_view(request):
@@ -56,7 +57,7 @@ def enroll_view(request):
 @login_required
 def unenroll_view(request, class_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.students.all() or request.user in class_object.instructors.all():
+    if not membership.is_student(request.user, class_object) or membership.is_instructor(request.user, class_object):
         raise Http404('No Class matches the given query.')
     class_object.students.remove(request.user)
     return redirect('/')
@@ -65,16 +66,25 @@ def unenroll_view(request, class_pk):
 @login_required
 def class_view(request, class_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.students.all() and request.user not in class_object.instructors.all():
+    if not membership.is_member(request.user, class_object):
         raise Http404('No Class matches the given query.')
-    context = {'class': class_object}
+    assignments = list(class_object.assignments.select_related(
+        'submission_files').prefetch_related('submission_files__files'))
+    statuses = models.Assignment.submission_statuses(
+        assignments, request.user)
+    submissions = {}
+    for submission in models.Submission.objects.filter(submitter=request.user, enrolled_class=class_object).only('pk', 'timestamp', 'assignment_id'):
+        submissions.setdefault(submission.assignment_id, []).append(submission)
+    rows = [(assignment, statuses[assignment.pk], submissions.get(assignment.pk, []))
+            for assignment in assignments]
+    context = {'class': class_object, 'rows': rows}
     return render(request, 'codemark/class.html', context=context)
 
 
 @login_required
 def submit_view(request, class_pk, assignment_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.students.all() and request.user not in class_object.instructors.all():
+    if not membership.is_member(request.user, class_object):
         raise Http404('No Class matches the given query.')
     assignment_object = get_object_or_404(models.Assignment, pk=assignment_pk)
     if not assignment_object in class_object.assignments.all() or not assignment_object.submittable(request.user):
@@ -99,14 +109,13 @@ def submit_view(request, class_pk, assignment_pk):
                 if form.is_valid():
                     file_object = form.save(commit=False)
                     file_object.creator = request.user
-                    upload_to = file_object.file.field.upload_to
-                    file_object.file.field.upload_to = lambda instance, filename: 'submission/{pk}/{name}'.format(pk=submission_object.pk, name=form.fields[
-                        'file'].label)
-                    file_object = form.save()
-                    file_object.file.field.upload_to = upload_to
+                    # Stored under the name the assignment expects, the bytes are shared with identical uploads
+                    file_object.file.name = form.fields['file'].label
+                    file_object.save()
                     submission_object.files.add(file_object)
             submission_object.save()
             trigger_run(submission_object)
+            index_submission.delay(submission_object.pk)
             return redirect('submission', submission_pk=submission_object.pk)
         else:
             context = {'formset': formset, 'class': class_object,
@@ -122,7 +131,7 @@ def submit_view(request, class_pk, assignment_pk):
 @login_required
 def run_submission_view(request, submission_pk):
     submission_object = get_object_or_404(models.Submission, pk=submission_pk)
-    if request.user not in submission_object.enrolled_class.instructors.all():
+    if not membership.is_instructor(request.user, submission_object.enrolled_class_id):
         raise Http404('No Submission matches the given query.')
     trigger_run(submission_object)
     return redirect('submission', submission_pk=submission_pk)
@@ -131,77 +140,113 @@ def run_submission_view(request, submission_pk):
 @login_required
 def run_assignment_view(request, class_pk, assignment_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.instructors.all():
+    if not membership.is_instructor(request.user, class_object):
         raise Http404('No Class matches the given query.')
     assignment_object = get_object_or_404(models.Assignment, pk=assignment_pk)
     if not assignment_object in class_object.assignments.all():
         raise Http404('No Assignment matches the given query.')
-    for submission in models.Submission.objects.filter(assignment=assignment_pk).filter(enrolled_class=class_pk).order_by('submitter', '-timestamp').distinct('submitter'):
-        trigger_run(submission)
+    rerun_object = models.Rerun()
+    rerun_object.creator = request.user
+    rerun_object.assignment = assignment_object
+    rerun_object.enrolled_class = class_object
+    rerun_object.save()
+    rerun_assignment.delay(rerun_object.pk)
     return redirect('grades', class_pk=class_pk)
 
 
+@login_required
+def rerun_progress_view(request, rerun_pk):
+    rerun_object = get_object_or_404(models.Rerun, pk=rerun_pk)
+    if not membership.is_instructor(request.user, rerun_object.enrolled_class_id):
+        raise Http404('No Rerun matches the given query.')
+    return JsonResponse(rerun_object.progress)
+
+
 @login_required
 def submission_view(request, submission_pk):
     submission_object = get_object_or_404(models.Submission, pk=submission_pk)
-    if request.user != submission_object.submitter and request.user not in submission_object.enrolled_class.instructors.all():
+    if request.user.pk != submission_object.submitter_id and not membership.is_instructor(request.user, submission_object.enrolled_class_id):
         raise Http404('No Submission matches the given query.')
     context = {'submission': submission_object}
     return render(request, 'codemark/submission.html', context=context)
 
 
+@login_required
+def step_output_view(request, step_output_pk, stream):
+    step_output = get_object_or_404(models.StepOutput, pk=step_output_pk)
+    submission_object = get_object_or_404(models.Submission.objects.distinct(
+    ), result__level_outputs__step_outputs=step_output)
+    is_instructor = membership.is_instructor(
+        request.user, submission_object.enrolled_class_id)
+    if not is_instructor and (request.user.pk != submission_object.submitter_id or step_output.hidden):
+        raise Http404('No Step Output matches the given query.')
+    if stream not in step_output.stream_fields:
+        raise Http404('No Step Output matches the given query.')
+    file = getattr(step_output, step_output.stream_fields[stream])
+    if not file:
+        text = getattr(step_output, 'actual_output' if stream ==
+                       'output' else stream) or ''
+        return HttpResponse(text, content_type='text/plain; charset=utf-8')
+    return StreamingHttpResponse(decompress(file), content_type='text/plain; charset=utf-8')
+
+
+def decompress(file):
+    # The response closes the generator when it's done or dropped, which closes the storage file
+    source = file.open('rb')
+    try:
+        with gzip.open(source) as output:
+            yield from iter(lambda: output.read(65536), b'')
+    finally:
+        source.close()
+
+
 @login_required
 def grades_view(request, class_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.instructors.all():
+    if not membership.is_instructor(request.user, class_object):
         raise Http404('No Class matches the given query.')
-    context = {'class': class_object}
+    gradebook = Gradebook(class_object, sort=request.GET.get('sort'), page=request.GET.get(
+        'page'), per_page=settings.GRADEBOOK_PAGE_SIZE)
+    context = {'class': class_object, 'gradebook': gradebook}
     return render(request, 'codemark/grades.html', context=context)
 
 
 @login_required
-def download_grades_view(request, class_pk, assignment_pk):
+def download_grades_view(request, class_pk, assignment_pk=None):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.instructors.all():
+    if not membership.is_instructor(request.user, class_object):
         raise Http404('No Class matches the given query.')
-    assignment_object = get_object_or_404(models.Assignment, pk=assignment_pk)
-    if not assignment_object in class_object.assignments.all():
-        raise Http404('No Assignment matches the given query.')
-    response = HttpResponse(
+    if assignment_pk is None:
+        assignments = list(class_object.assignments.all())
+        filename = str(class_object.course) + '.' + class_object.section
+    else:
+        assignment_object = get_object_or_404(
+            models.Assignment, pk=assignment_pk)
+        if not assignment_object in class_object.assignments.all():
+            raise Http404('No Assignment matches the given query.')
+        assignments = [assignment_object]
+        filename = str(assignment_object)
+    response = StreamingHttpResponse(
+        export_rows(class_object, assignments,
+                    settings.GRADEBOOK_EXPORT_CHUNK_SIZE),
         content_type='text/csv'
     )
     response['Content-Disposition'] = 'attachment; filename={0}.csv'.format(
-        assignment_object)
-    writer = csv.writer(response)
-    writer.writerow([
-        'Last Name',
-        'First Name',
-        'Username',
-        'Student ID',
-        'Last Access',
-        'Grade [Total Pts: {0}]'.format(assignment_object.total_points)
-    ])
-    for student in class_object.students.all():
-        submission = None
-        query = models.Submission.objects.filter(submitter=student).filter(
-            assignment=assignment_pk).filter(enrolled_class=class_pk)
-        if query.count() > 0:
-            submission = query.latest()
-        writer.writerow([student.last_name,
-                         student.first_name,
-                         student.username,
-                         student.school_id,
-                         submission.timestamp.strftime(
-                             '%Y-%m-%d %H:%M:%S') if submission else '',
-                         submission.latest_result.grade if submission else ''
-                         ])
+        filename)
     return response
 
 
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not request.user.is_staff and (not token or request.headers.get('Authorization') != 'Bearer ' + token):
+        raise Http404('No Metrics match the given query.')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def plagiarism_view(request, class_pk, assignment_pk):
     class_object = get_object_or_404(models.Class, pk=class_pk)
-    if request.user not in class_object.instructors.all():
+    if not membership.is_instructor(request.user, class_object):
         raise Http404('No Class matches the given query.')
     assignment_object = get_object_or_404(models.Assignment, pk=assignment_pk)
     if not assignment_object in class_object.assignments.all():
@@ -209,19 +254,11 @@ def plagiarism_view(request, class_pk, assignment_pk):
     if request.method == 'POST':
         form = forms.PlagiarismForm(request.POST)
         if form.is_valid():
-            language = form.cleaned_data['language_field']
-            m = mosspy.Moss(settings.MOSS_ID, language)
-            submissions = models.Submission.objects.filter(assignment=assignment_object).order_by(
-                'submitter', '-timestamp').distinct('submitter')
-            dir = tempfile.TemporaryDirectory()
-            for submission in submissions:
-                for file in submission.files.all():
-                    file.copy(dir.name, '{0}_{1}'.format(
-                        submission.submitter.username, os.path.basename(file.file.name)))
-            m.addFilesByWildcard('{0}/*'.format(dir.name))
-            url = m.send()
-            dir.cleanup()
-            return redirect(url)
+            report = models.PlagiarismReport.objects.create(
+                creator=request.user, assignment=assignment_object, enrolled_class=class_object,
+                language=form.cleaned_data['language_field'], engine=form.cleaned_data['engine_field'])
+            run_plagiarism.delay(report.pk)
+            return redirect('plagiarism_report', report_pk=report.pk)
         else:
             context = {'form': form}
             return render(request, 'codemark/forms/plagiarism_form.html', context=context)
@@ -231,6 +268,55 @@ def plagiarism_view(request, class_pk, assignment_pk):
         return render(request, 'codemark/forms/plagiarism_form.html', context=context)
 
 
+@login_required
+def plagiarism_report_view(request, report_pk):
+    report = get_object_or_404(models.PlagiarismReport.objects.select_related(
+        'assignment', 'enrolled_class'), pk=report_pk)
+    if not membership.is_instructor(request.user, report.enrolled_class):
+        raise Http404('No Report matches the given query.')
+    if report.url and report.status == models.PlagiarismReport.Status.FINISHED:
+        return redirect(report.url)
+    submitters = dict(models.Submission.objects.filter(pk__in=[
+        pk for pair in report.pairs for pk in (pair['a'], pair['b'])
+    ]).values_list('pk', 'submitter__username'))
+    pairs = [
+        (number, submitters.get(pair['a']), submitters.get(pair['b']), pair) for number, pair in enumerate(report.pairs)
+    ]
+    context = {'report': report, 'pairs': pairs}
+    return render(request, 'codemark/plagiarism.html', context=context)
+
+
+def highlighted_files(submission, line_ranges):
+    files = []
+    for file in submission.files.all():
+        ranges = line_ranges.get(str(file.pk), [])
+        lines = [
+            (number, line, any(first <= number <= last for first, last in ranges))
+            for number, line in enumerate(plagiarism.read_text(file).splitlines(), 1)
+        ]
+        files.append((file, lines))
+    return files
+
+
+@login_required
+def plagiarism_pair_view(request, report_pk, pair):
+    report = get_object_or_404(models.PlagiarismReport.objects.select_related(
+        'enrolled_class'), pk=report_pk)
+    if not membership.is_instructor(request.user, report.enrolled_class) or pair >= len(report.pairs):
+        raise Http404('No Report matches the given query.')
+    pair = report.pairs[pair]
+    submissions = models.Submission.objects.select_related(
+        'submitter').prefetch_related('files').in_bulk([pair['a'], pair['b']])
+    if len(submissions) < 2:
+        raise Http404('No Submission matches the given query.')
+    sides = [
+        (submissions[pair[side]], pair[side + '_percent'], highlighted_files(submissions[pair[side]], pair[side + '_lines']))
+        for side in ('a', 'b')
+    ]
+    context = {'report': report, 'sides': sides}
+    return render(request, 'codemark/plagiarism_pair.html', context=context)
+
+
 @login_required
 def index_view(request):
     form = forms.EnrollForm(user=request.user)
@@ -257,7 +343,7 @@ class ProfileView(LoginRequiredMixin, UpdateView):
 
 class ErrorIfNotInstructorMixin(AccessMixin):
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_instructor:
+        if not membership.instructs_any(request.user):
             return self.handle_no_permission()
         return super(ErrorIfNotInstructorMixin, self).dispatch(request, *args, **kwargs)
 
@@ -289,7 +375,7 @@ class ClassAssignmentsUpdateView(LoginRequiredMixin, FormParameterMixin, UpdateP
     def dispatch(self, request, *args, **kwargs):
         class_object = get_object_or_404(
             models.Class, pk=self.kwargs['pk'])
-        if request.user not in class_object.instructors.all():
+        if not membership.is_instructor(request.user, class_object):
             return self.handle_no_permission()
         return super(ClassAssignmentsUpdateView, self).dispatch(request, *args, **kwargs)
 
@@ -202,4 +202,128 @@ CHANNEL_LAYERS = {
 }
 
 # Stanford MOSS
-MOSS_ID = config['MOSS_ID']
\ No newline at end of file
+MOSS_ID = config['MOSS_ID']
+MOSS_SERVER = 'moss.stanford.edu'
+MOSS_PORT = 7690
+
+# Grading Container Pool
+# Idle containers kept per image, runs before a container is recycled and
+# seconds an idle container is kept before it is stopped. Expired containers
+# are only stopped when a worker next acquires a container
+
+CONTAINER_POOL_SIZE = 2
+CONTAINER_POOL_MAX_USES = 25
+CONTAINER_POOL_IDLE_TIMEOUT = 300
+CONTAINER_POOL_PREWARM = {
+    'gcc': 1,
+}
+
+# Levels of one result run at the same time per worker process when an
+# assignment runs its levels in parallel
+
+LEVEL_CONCURRENCY = 4
+
+# Submissions whose results are created and queued together when an
+# instructor reruns an assignment. A rerun still unfinished after
+# RERUN_TIMEOUT seconds is reported as stalled and no longer polled
+
+RERUN_CHUNK_SIZE = 50
+RERUN_TIMEOUT = 3600
+
+# Live step output is sent to the submission page at most every
+# OUTPUT_STREAM_INTERVAL seconds, OUTPUT_STREAM_SIZE bytes at a time
+
+OUTPUT_STREAM_INTERVAL = 0.5
+OUTPUT_STREAM_SIZE = 16384
+
+# Worker File Cache
+# Fixture and submission files are kept on each worker by content hash, up
+# to FILE_CACHE_SIZE bytes. Hard links are only safe when no step writes to
+# the files it was given in place
+
+FILE_CACHE_DIR = '/tmp/codemark-cache'
+FILE_CACHE_SIZE = 2 * 1024 ** 3
+FILE_CACHE_HARDLINKS = False
+
+# Students shown per page of the grades page
+
+GRADEBOOK_PAGE_SIZE = 50
+
+# Students fetched per round trip of the server-side cursor behind the
+# grade CSV export
+
+GRADEBOOK_EXPORT_CHUNK_SIZE = 500
+
+# Class membership answers cached in Redis for MEMBERSHIP_CACHE_TIMEOUT
+# seconds, dropped when a roster changes. Redis calls give up after
+# MEMBERSHIP_CACHE_SOCKET_TIMEOUT seconds and the database is asked instead
+
+MEMBERSHIP_CACHE_URL = 'redis://redis:6379/1'
+MEMBERSHIP_CACHE_TIMEOUT = 300
+MEMBERSHIP_CACHE_SOCKET_TIMEOUT = 0.1
+
+# Step output capture
+# A step is stopped once a stream passes OUTPUT_CAPTURE_LIMIT bytes. Streams
+# longer than OUTPUT_INLINE_LIMIT bytes are stored compressed and only their
+# start is kept in the database
+
+OUTPUT_CAPTURE_LIMIT = 8 * 1024 ** 2
+OUTPUT_INLINE_LIMIT = 64 * 1024
+
+# Test step diffs
+# Computed once when a test step finishes, skipped when either side has more
+# than DIFF_TOKEN_LIMIT lines and line breaks. Stretches that need more than
+# DIFF_MAX_COST edits are shown as replaced whole
+
+DIFF_TOKEN_LIMIT = 20000
+DIFF_MAX_COST = 500
+
+# Plagiarism check
+# Submissions are fingerprinted by the smallest hash of every
+# PLAGIARISM_WINDOW consecutive PLAGIARISM_KGRAM token sequences, so shared
+# code of at least KGRAM + WINDOW - 1 tokens is always found. Fingerprints
+# found in more than PLAGIARISM_MAX_SHARED submissions are ignored
+
+PLAGIARISM_KGRAM = 10
+PLAGIARISM_WINDOW = 6
+PLAGIARISM_MAX_SHARED = 10
+PLAGIARISM_REPORT_PAIRS = 250
+
+# Submission files read from storage at once by a plagiarism check
+
+PLAGIARISM_FETCH_CONCURRENCY = 8
+
+# Grading phase timings
+# Histograms are kept in Redis and served at /metrics/ to staff users or
+# requests carrying METRICS_TOKEN as a bearer token. Every timing is also
+# logged as a JSON line by the codemark.metrics logger. Timings are buffered
+# per process and sent to Redis after each task, giving up after
+# METRICS_SOCKET_TIMEOUT seconds
+
+METRICS_URL = 'redis://redis:6379/2'
+METRICS_SOCKET_TIMEOUT = 0.1
+METRICS_TOKEN = config.get('METRICS_TOKEN')
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'codemark.metrics': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}